@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Startup-time benchmark for the organizer entry points.
+
+Runs `python -X importtime` for each entry module several times and reports the
+median cumulative import time, plus the wall-clock time of `file_organizer.py --help`.
+Use --max-ms to fail (exit status 1) when an entry point gets slower than a budget.
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+ENTRY_MODULES = ['file_organizer', 'file_organizer_gui']
+REPO_DIR = Path(__file__).resolve().parent
+
+
+def measure_import_us(module: str) -> int:
+    """Return the cumulative import time of module in microseconds."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=str(REPO_DIR), stderr=subprocess.PIPE, stdout=subprocess.DEVNULL,
+        universal_newlines=True, check=True,
+    )
+    for line in reversed(result.stderr.splitlines()):
+        # Format: "import time: self [us] | cumulative | imported package"
+        fields = [field.strip() for field in line.split('|')]
+        if len(fields) == 3 and fields[2] == module:
+            return int(fields[1])
+    raise RuntimeError(f"No importtime line for {module}")
+
+
+def measure_cli_ms() -> float:
+    """Return the wall-clock time of running the CLI with --help, in milliseconds."""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, 'file_organizer.py', '--help'], cwd=str(REPO_DIR),
+                   stdout=subprocess.DEVNULL, check=True)
+    return (time.perf_counter() - start) * 1000
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure organizer startup time.")
+    parser.add_argument('--runs', type=int, default=7, help="runs per measurement (default 7)")
+    parser.add_argument('--max-ms', type=float, help="fail if any entry module imports slower than this")
+    args = parser.parse_args()
+
+    results: Dict[str, List[int]] = {}
+    for module in ENTRY_MODULES:
+        try:
+            results[module] = [measure_import_us(module) for _ in range(args.runs)]
+        except subprocess.CalledProcessError:
+            # e.g. tkinter is not installed
+            print(f"{module:<24} skipped (import failed)")
+
+    failed = False
+    for module, samples in results.items():
+        median_ms = statistics.median(samples) / 1000
+        print(f"{module:<24} import {median_ms:8.1f} ms (median of {len(samples)})")
+        if args.max_ms is not None and median_ms > args.max_ms:
+            failed = True
+
+    cli_ms = statistics.median(measure_cli_ms() for _ in range(args.runs))
+    print(f"{'file_organizer.py --help':<24} total  {cli_ms:8.1f} ms (median of {args.runs})")
+
+    if failed:
+        print(f"Startup budget of {args.max_ms} ms exceeded.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,11 @@
 from pathlib import Path
-import shutil
+import errno
+import os
 import logging
-from typing import Dict, List, Optional
+import sys
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+from file_organizer_ignore import IGNORE_FILENAME, IgnoreMatcher
 
 # Configuration
 FILE_CATEGORIES: Dict[str, List[str]] = {
@@ -16,6 +20,26 @@ FILE_CATEGORIES: Dict[str, List[str]] = {
 
 MISC_FOLDER = "MISC"
 LOG_FILENAME = 'file_organizer.log'
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# renameat2(2) constants (see <linux/fs.h> and <fcntl.h>)
+AT_FDCWD = -100
+RENAME_NOREPLACE = 1
+
+# errno values meaning "this kernel/filesystem can't do it", not a real failure
+# (EPERM is left out: it is also a real permission denial, e.g. in a sticky directory)
+_UNSUPPORTED_ERRNOS = {errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP, errno.ENOTSUP}
+
+_renameat2 = None
+_renameat2_loaded = False
+
+# Extension -> category, compiled from FILE_CATEGORIES on first use
+_extension_index: Optional[Dict[str, str]] = None
+
+# Modules such as shutil, tempfile, argparse and the optional engines (bundles,
+# estimator, transfer, storage, throttle) are imported inside the functions that
+# need them, so hooks and cron jobs only pay for what they use. Run
+# bench_startup.py to check import times.
 
 
 def setup_logging() -> None:
@@ -55,12 +79,22 @@ def to_camel_case(text: str) -> str:
     return ''.join(result_words)
 
 
+def _get_extension_index() -> Dict[str, str]:
+    """Compile FILE_CATEGORIES into an extension -> category lookup table."""
+    global _extension_index
+    if _extension_index is None:
+        index = {}
+        for category, extensions in FILE_CATEGORIES.items():
+            for extension in extensions:
+                # First category listing an extension wins, as with the linear scan
+                index.setdefault(extension, category)
+        _extension_index = index
+    return _extension_index
+
+
 def get_file_category(extension: str) -> str:
     """Determine the category for a given file extension."""
-    for category, extensions in FILE_CATEGORIES.items():
-        if extension in extensions:
-            return category
-    return 'Others'
+    return _get_extension_index().get(extension, 'Others')
 
 
 def get_destination_folder_name(file_extension: str) -> str:
@@ -77,9 +111,74 @@ def get_destination_folder_name(file_extension: str) -> str:
     return to_camel_case(category)
 
 
-def get_source_directory() -> Optional[Path]:
-    """Get and validate the source directory from user input."""
-    source_path = input("Enter the source directory path: ")
+def parse_size(text: str) -> int:
+    """Parse a human readable size such as '512K', '50M' or '2G' into bytes."""
+    units = {'': 1, 'B': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+    value = text.strip().upper()
+    if value.endswith('IB'):
+        value = value[:-2]
+    elif value.endswith('B') and len(value) > 1 and not value[-2].isdigit():
+        value = value[:-1]
+    
+    number = value.rstrip('BKMGT')
+    unit = value[len(number):]
+    if unit not in units:
+        raise ValueError(f"Invalid size: {text}")
+    return int(float(number) * units[unit])
+
+
+def positive_number(text: str) -> float:
+    """argparse type for a number that must be greater than zero."""
+    import argparse
+    try:
+        value = float(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid number: {text}")
+    if not 0 < value < float('inf'):
+        raise argparse.ArgumentTypeError(f"must be greater than 0: {text}")
+    return value
+
+
+def fraction(text: str) -> float:
+    """argparse type for a fraction greater than zero and at most one."""
+    import argparse
+    try:
+        value = float(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid number: {text}")
+    if not 0 < value <= 1:
+        raise argparse.ArgumentTypeError(f"must be greater than 0 and at most 1: {text}")
+    return value
+
+
+def positive_size(text: str) -> int:
+    """argparse type for a size (see parse_size) that must be greater than zero."""
+    import argparse
+    try:
+        value = parse_size(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid size: {text}")
+    if value <= 0:
+        raise argparse.ArgumentTypeError(f"must be greater than 0: {text}")
+    return value
+
+
+def format_size(size_bytes: float) -> str:
+    """Format a file size in human readable form."""
+    if size_bytes == 0:
+        return "0 B"
+    size_names = ["B", "KB", "MB", "GB", "TB"]
+    i = 0
+    while size_bytes >= 1024 and i < len(size_names) - 1:
+        size_bytes /= 1024.0
+        i += 1
+    return f"{size_bytes:.1f} {size_names[i]}"
+
+
+def get_source_directory(source_path: Optional[str] = None) -> Optional[Path]:
+    """Get and validate the source directory, prompting the user if none is given."""
+    if source_path is None:
+        source_path = input("Enter the source directory path: ")
     # Strip quotes and whitespace that might be accidentally included
     source_path = source_path.strip().strip('"').strip("'")
     source_dir = Path(source_path)
@@ -109,34 +208,165 @@ def create_destination_directory(base_dir: Path, folder_name: str) -> Optional[P
         return None
 
 
-def get_unique_filename(destination_dir: Path, filename: str) -> str:
-    """Generate a unique filename if the original already exists."""
-    base_path = destination_dir / filename
-    if not base_path.exists():
-        return filename
+def _get_renameat2():
+    """Load libc's renameat2() through ctypes, or return None if it is unavailable."""
+    global _renameat2, _renameat2_loaded
+    if _renameat2_loaded:
+        return _renameat2
+    _renameat2_loaded = True
+    
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        import ctypes
+        libc = ctypes.CDLL(None, use_errno=True)
+        func = libc.renameat2  # glibc >= 2.28
+    except (OSError, AttributeError):
+        return None
     
-    # Split filename and extension
-    name_part = base_path.stem
-    extension = base_path.suffix
-    counter = 1
+    func.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p, ctypes.c_uint]
+    func.restype = ctypes.c_int
+    _renameat2 = func
+    return _renameat2
+
+
+def rename_no_replace(source: Path, destination: Path) -> None:
+    """Atomically rename source to destination, raising FileExistsError if destination exists."""
+    renameat2 = _get_renameat2()
+    if renameat2 is not None:
+        if renameat2(AT_FDCWD, os.fsencode(str(source)), AT_FDCWD, os.fsencode(str(destination)),
+                     RENAME_NOREPLACE) == 0:
+            return
+        import ctypes
+        err = ctypes.get_errno()
+        if err not in _UNSUPPORTED_ERRNOS:
+            raise OSError(err, os.strerror(err), str(source), None, str(destination))
+        # Filesystem doesn't support RENAME_NOREPLACE, fall through to link + unlink
+    
+    if os.name == 'nt':
+        # os.rename never replaces an existing file on Windows
+        os.rename(str(source), str(destination))
+        return
+    
+    try:
+        # link() fails with EEXIST instead of replacing, so no file can be overwritten
+        os.link(str(source), str(destination))
+    except OSError as e:
+        if e.errno not in _UNSUPPORTED_ERRNOS:
+            raise
+        # No hard links on this filesystem, so the best we can do is probe first
+        if os.path.lexists(str(destination)):
+            raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), str(destination))
+        os.rename(str(source), str(destination))
+        return
+    try:
+        os.unlink(str(source))
+    except OSError:
+        # Don't leave the file in both places
+        os.unlink(str(destination))
+        raise
+
+
+def _rename_into(source: Path, destination_dir: Path, filename: str) -> Path:
+    """Rename source into destination_dir as filename, or stem_N if that name is taken."""
+    name_part = Path(filename).stem
+    extension = Path(filename).suffix
+    candidate = filename
+    counter = 0
     
-    # Keep incrementing counter until we find a unique name
     while True:
-        new_filename = f"{name_part}_{counter}{extension}"
-        new_path = destination_dir / new_filename
-        if not new_path.exists():
-            return new_filename
-        counter += 1
+        destination_path = destination_dir / candidate
+        try:
+            rename_no_replace(source, destination_path)
+            return destination_path
+        except FileExistsError:
+            counter += 1
+            candidate = f"{name_part}_{counter}{extension}"
+
+
+def _copy_file(source_file: Path, destination_path: Path, throttle=None) -> None:
+    """Copy file data and metadata, pacing the bytes through the throttle if it limits them."""
+    import shutil
+    
+    if throttle is None or not throttle.limits_bytes:
+        shutil.copy2(str(source_file), str(destination_path))
+        return
+    
+    with open(source_file, 'rb') as src, open(destination_path, 'wb') as dst:
+        while True:
+            chunk = src.read(COPY_CHUNK_SIZE)
+            if not chunk:
+                break
+            throttle.wait_bytes(len(chunk))
+            dst.write(chunk)
+    shutil.copystat(str(source_file), str(destination_path))
+
+
+def _move_large_file(source_file: Path, destination_dir: Path, throttle=None,
+                     progress: Optional[Callable[[int, int], None]] = None) -> Path:
+    """Move a large file across devices with a resumable, verified chunked copy."""
+    from file_organizer_transfer import discard_partial, partial_path_for, transfer_large_file
+    
+    partial_path = partial_path_for(source_file, destination_dir)
+    transfer_large_file(source_file, partial_path, throttle, progress)
+    destination_path = _rename_into(partial_path, destination_dir, source_file.name)
+    # Drops the checkpoint; the partial file itself has been renamed away
+    discard_partial(partial_path)
+    source_file.unlink()
+    return destination_path
+
+
+def move_file_no_clobber(source_file: Path, destination_dir: Path, throttle=None,
+                         progress: Optional[Callable[[int, int], None]] = None) -> Path:
+    """Move a file into destination_dir without ever overwriting, returning its final path.
+    
+    Collisions are resolved by the rename itself failing with EEXIST, so there is no
+    exists() probe and no window in which a concurrent organizer can be overwritten.
+    An optional IOThrottle paces the data copied on cross-device moves. Large files
+    on another device are copied resumably, calling progress(bytes_done, total).
+    """
+    try:
+        return _rename_into(source_file, destination_dir, source_file.name)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+    
+    from file_organizer_transfer import LARGE_FILE_THRESHOLD
+    # Needs pread/pwrite, which Windows lacks
+    if hasattr(os, 'pread') and source_file.stat().st_size >= LARGE_FILE_THRESHOLD:
+        return _move_large_file(source_file, destination_dir, throttle, progress)
+    
+    # Different filesystem: copy next to the destination, then rename into place
+    import tempfile
+    fd, temp_name = tempfile.mkstemp(prefix='.', suffix='.organizer-tmp', dir=str(destination_dir))
+    os.close(fd)
+    temp_path = Path(temp_name)
+    try:
+        _copy_file(source_file, temp_path, throttle)
+        destination_path = _rename_into(temp_path, destination_dir, source_file.name)
+    except BaseException:
+        try:
+            temp_path.unlink()
+        except OSError:
+            pass
+        raise
+    
+    source_file.unlink()
+    return destination_path
 
 
-def move_file(source_file: Path, destination_dir: Path) -> bool:
-    """Move a file to the destination directory, handling duplicates by renaming."""
-    # Get unique filename if original already exists
-    unique_filename = get_unique_filename(destination_dir, source_file.name)
-    destination_path = destination_dir / unique_filename
+def move_file(source_file: Path, destination_dir: Path, throttle=None, history=None) -> bool:
+    """Move a file to the destination directory, handling duplicates by renaming.
     
+    If a MoveHistory is given, the move is recorded in it.
+    """
     try:
-        shutil.move(str(source_file), str(destination_path))
+        if throttle is not None:
+            throttle.wait_op()
+        destination_path = move_file_no_clobber(source_file, destination_dir, throttle)
+        if history is not None:
+            history.record(source_file, str(destination_path))
+        unique_filename = destination_path.name
         if unique_filename != source_file.name:
             print(f"Moved file: {source_file.name} to {destination_dir} (renamed to {unique_filename})")
             logging.info(f"Moved file: {source_file.name} to {destination_dir}, renamed to {unique_filename}")
@@ -154,11 +384,10 @@ def move_file(source_file: Path, destination_dir: Path) -> bool:
         return False
 
 
-def process_file(file_path: Path, source_dir: Path) -> bool:
-    """Process a single file and move it to the appropriate category folder."""
+def log_found_file(file_path: Path) -> None:
+    """Report a discovered file and its category."""
     file_extension = file_path.suffix.lower()
     
-    # Log file discovery
     if not file_extension:
         print(f"No extension for file: {file_path.name}")
         logging.info(f"No extension for file: {file_path.name}")
@@ -170,6 +399,12 @@ def process_file(file_path: Path, source_dir: Path) -> bool:
         else:
             print(f"Found file: '{file_path.name}', extension: {file_extension} (Category: {category})")
             logging.info(f"Found file: {file_path.name}, extension: {file_extension}, category: {category}")
+
+
+def process_file(file_path: Path, source_dir: Path, throttle=None, history=None) -> bool:
+    """Process a single file and move it to the appropriate category folder."""
+    file_extension = file_path.suffix.lower()
+    log_found_file(file_path)
     
     # Determine destination folder
     folder_name = get_destination_folder_name(file_extension)
@@ -178,7 +413,7 @@ def process_file(file_path: Path, source_dir: Path) -> bool:
     if destination_dir is None:
         return False
     
-    return move_file(file_path, destination_dir)
+    return move_file(file_path, destination_dir, throttle, history)
 
 
 def should_skip_file(file_path: Path) -> bool:
@@ -204,41 +439,205 @@ def should_skip_file(file_path: Path) -> bool:
     if filename in system_files:
         return True
     
-    # Skip files that are the organizer itself or its log
+    # Skip files that are the organizer itself, its log or its move history
     if filename in ['file_organizer.py', 'file_organizer.log']:
         return True
+    if filename.startswith('file_organizer_history.db'):
+        return True
     
     return False
 
 
-def organize_files_in_directory(source_dir: Path) -> int:
-    """Organize all files in the source directory and return count of moved files."""
+def get_category_folder_names() -> Set[str]:
+    """Return the folder names used for the predefined categories."""
+    names = {to_camel_case(category) for category in FILE_CATEGORIES}
+    names.add(to_camel_case(MISC_FOLDER))
+    return names
+
+
+def scan_directory(directory: str, rel_dir: str, subdirs: List[Tuple[str, str]], recursive: bool = False,
+                   matcher: Optional[IgnoreMatcher] = None,
+                   exclude: Optional[Set[str]] = None) -> Iterator[os.DirEntry]:
+    """Yield the files to organize in one directory, appending the subfolders to visit to subdirs.
+    
+    rel_dir is the directory's path relative to the source directory ('' for the
+    source itself); subfolders are appended as (path, rel_path) pairs. Files whose
+    real path is in exclude are skipped. This is the single-directory step of
+    iter_file_entries, for callers that walk the tree their own way.
+    """
+    if matcher is None:
+        matcher = IgnoreMatcher()
+    category_folders = get_category_folder_names() if recursive and not rel_dir else set()
+    real_directory = os.path.realpath(directory) if exclude else None
+    
+    ignore_file = os.path.join(directory, IGNORE_FILENAME)
+    if os.path.isfile(ignore_file):
+        matcher.add_file(Path(ignore_file), rel_dir)
+    
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if should_skip_file(Path(entry.name)):
+                    continue
+                rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if (recursive and entry.name not in category_folders
+                                and not matcher.matches(rel_path, True)):
+                            subdirs.append((entry.path, rel_path))
+                    elif entry.is_file() and not matcher.matches(rel_path, False):
+                        if real_directory is not None and os.path.join(real_directory, entry.name) in exclude:
+                            continue
+                        # Extension folders created earlier (or during this run) are already organized
+                        if rel_dir and '/' not in rel_dir and rel_dir == get_destination_folder_name(
+                                os.path.splitext(entry.name)[1].lower()):
+                            continue
+                        yield entry
+                except OSError as e:
+                    logging.error(f"Cannot read {entry.path}: {e}")
+    except OSError as e:
+        print(f"Error listing directory {directory}: {e}")
+        logging.error(f"Error listing directory {directory}: {e}")
+
+
+def iter_file_entries(source_dir: Path, recursive: bool = False, matcher: Optional[IgnoreMatcher] = None,
+                      exclude: Optional[Set[str]] = None) -> Iterator[os.DirEntry]:
+    """Yield directory entries for the files in source_dir that should be organized.
+    
+    Rules from .organizerignore files (plus the built-in defaults) are applied while
+    walking, so excluded folders are pruned before they are ever listed. Symlinked
+    folders are not followed, and in recursive mode the top-level category folders
+    are skipped and files already in their destination folder are left alone.
+    Files whose real path is in exclude (such as the open move history) are skipped.
+    """
+    if matcher is None:
+        matcher = IgnoreMatcher()
+    
+    pending = [(str(source_dir), '')]
+    while pending:
+        directory, rel_dir = pending.pop()
+        subdirs: List[Tuple[str, str]] = []
+        yield from scan_directory(directory, rel_dir, subdirs, recursive, matcher, exclude)
+        # Depth-first, visiting subfolders in listing order
+        pending.extend(reversed(subdirs))
+
+
+def organize_files_in_directory(source_dir: Path, throttle=None, recursive: bool = False,
+                                matcher: Optional[IgnoreMatcher] = None, backend=None, history=None) -> int:
+    """Organize all files in the source directory and return count of moved files.
+    
+    By default files go into category folders inside source_dir; a StorageBackend
+    from file_organizer_storage can send them somewhere else instead.
+    """
     files_moved = 0
     print(f"Organizing files in: {source_dir.resolve()}")
     logging.info(f"Organizing files in: {source_dir.resolve()}")
+    # The history database may live inside source_dir under any name
+    exclude = history.database_files() if history is not None else None
     
-    for item in source_dir.iterdir():
-        if item.is_file() and not should_skip_file(item):
-            if process_file(item, source_dir):
-                files_moved += 1
+    if backend is not None:
+        def pending_files():
+            for entry in iter_file_entries(source_dir, recursive, matcher, exclude):
+                file_path = Path(entry.path)
+                log_found_file(file_path)
+                yield file_path, get_destination_folder_name(file_path.suffix.lower())
+        # Backends may move several files at once
+        return backend.move_files(pending_files())
+    
+    for entry in iter_file_entries(source_dir, recursive, matcher, exclude):
+        if process_file(Path(entry.path), source_dir, throttle, history):
+            files_moved += 1
     
     return files_moved
 
 
-def organize_files() -> None:
-    """Main function to organize files in a directory."""
+def load_ignore_matcher(extra_ignore_file: Optional[str] = None) -> IgnoreMatcher:
+    """Build the matcher with the default rules plus an optional extra ignore file."""
+    matcher = IgnoreMatcher()
+    if extra_ignore_file:
+        matcher.add_file(Path(extra_ignore_file))
+    return matcher
+
+
+def organize_files(source_path: Optional[str] = None, throttle=None,
+                   consolidate_below: Optional[int] = None, bundle_size: Optional[int] = None,
+                   recursive: bool = False, ignore_file: Optional[str] = None,
+                   target: Optional[str] = None, endpoint_url: Optional[str] = None,
+                   tier_policy=None, history_db: Optional[str] = None, idle_io: bool = False) -> None:
+    """Main function to organize files in a directory.
+    
+    With recursive, files in subfolders are organized too. Paths matched by
+    .organizerignore files or ignore_file are skipped. target sends files to another
+    folder or an s3://bucket/prefix instead of source_dir. If consolidate_below is
+    given, files smaller than that many bytes are then packed into per-category
+    bundles of at most bundle_size bytes. A TieringPolicy from file_organizer_tiering
+    moves large or old organized files to a cold volume before bundling. Every move
+    is recorded in the history database at history_db. With idle_io the process
+    switches to the idle I/O scheduling class (Linux) before moving anything.
+    """
     setup_logging()
     print("-----Basic File Organizer-----")
     logging.info("Started file organization process.")
     
-    source_dir = get_source_directory()
+    if idle_io:
+        from file_organizer_throttle import set_io_priority
+        set_io_priority()
+    
+    source_dir = get_source_directory(source_path)
     if source_dir is None:
         return
     
     print(f"Source directory: {source_dir}")
     logging.info(f"Source directory: {source_dir}")
     
-    files_moved = organize_files_in_directory(source_dir)
+    try:
+        matcher = load_ignore_matcher(ignore_file)
+    except OSError as e:
+        print(f"Error reading ignore file {ignore_file}: {e}")
+        logging.error(f"Error reading ignore file {ignore_file}: {e}")
+        return
+    
+    import sqlite3
+    from file_organizer_history import HISTORY_FILENAME, MoveHistory
+    try:
+        history = MoveHistory(Path(history_db or HISTORY_FILENAME))
+        run_id = history.start_run(source_dir)
+    except sqlite3.Error as e:
+        print(f"Error opening move history {history_db or HISTORY_FILENAME}: {e}")
+        logging.error(f"Error opening move history {history_db or HISTORY_FILENAME}: {e}")
+        return
+    print(f"Recording moves as run {run_id} in {history.db_path}")
+    logging.info(f"Recording moves as run {run_id} in {history.db_path}")
+    
+    try:
+        _run_organization(source_dir, throttle, recursive, matcher, target, endpoint_url,
+                          tier_policy, consolidate_below, bundle_size, history)
+    finally:
+        history.close()
+
+
+def _run_organization(source_dir: Path, throttle, recursive: bool, matcher: IgnoreMatcher,
+                      target: Optional[str], endpoint_url: Optional[str], tier_policy,
+                      consolidate_below: Optional[int], bundle_size: Optional[int], history) -> None:
+    """Organize source_dir, then run the optional tiering and bundling stages."""
+    backend = None
+    if target:
+        from file_organizer_storage import open_backend
+        try:
+            backend = open_backend(target, throttle, endpoint_url, history)
+        except ValueError as e:
+            print(f"Invalid target: {e}")
+            logging.error(f"Invalid target {target}: {e}")
+            history.finish_run(0)
+            return
+        print(f"Target: {target}")
+        logging.info(f"Target: {target}")
+    
+    try:
+        files_moved = organize_files_in_directory(source_dir, throttle, recursive, matcher, backend, history)
+    finally:
+        if backend is not None:
+            backend.close()
     
     # Report results
     if files_moved > 0:
@@ -247,10 +646,238 @@ def organize_files() -> None:
     else:
         print("No files were moved.")
         logging.info("No files were moved.")
+    
+    organized_dir = Path(target) if target else source_dir
+    remote_target = bool(target and target.startswith('s3://'))
+    
+    tiered = 0
+    if tier_policy is not None and remote_target:
+        print("Tiering is only available for local targets, skipping.")
+        logging.warning("Skipped tiering for an s3:// target")
+    elif tier_policy is not None:
+        from file_organizer_tiering import tier_files
+        tiered = tier_files(organized_dir, tier_policy, throttle, history)
+        print(f"Tiered {tiered} files to {tier_policy.cold_root}.")
+        logging.info(f"Tiered {tiered} files to {tier_policy.cold_root}.")
+    
+    consolidated = 0
+    if consolidate_below and remote_target:
+        print("Small-file bundling is only available for local targets, skipping.")
+        logging.warning("Skipped small-file bundling for an s3:// target")
+    elif consolidate_below:
+        from file_organizer_bundles import DEFAULT_BUNDLE_SIZE, consolidate_organized_folders
+        consolidated = consolidate_organized_folders(organized_dir, consolidate_below,
+                                                     bundle_size or DEFAULT_BUNDLE_SIZE, throttle, history)
+        print(f"Bundled {consolidated} small files in total.")
+        logging.info(f"Bundled {consolidated} small files in total.")
+    
+    # Every stage records its moves in the history, so the run counts all of them
+    history.finish_run(files_moved + tiered + consolidated)
+
+
+def estimate_files(source_path: Optional[str], sample_fraction: Optional[float] = None,
+                   recursive: bool = False, ignore_file: Optional[str] = None,
+                   subdir_fraction: Optional[float] = None) -> None:
+    """Print a quick sampled estimate of what organizing the directory would move."""
+    from file_organizer_estimate import (
+        DEFAULT_SAMPLE_FRACTION,
+        DEFAULT_SUBDIR_FRACTION,
+        estimate_directory,
+        total_estimate
+    )
+    
+    source_dir = get_source_directory(source_path)
+    if source_dir is None:
+        return
+    
+    try:
+        matcher = load_ignore_matcher(ignore_file)
+    except OSError as e:
+        print(f"Error reading ignore file {ignore_file}: {e}")
+        return
+    
+    if sample_fraction is None:
+        sample_fraction = DEFAULT_SAMPLE_FRACTION
+    if subdir_fraction is None:
+        subdir_fraction = DEFAULT_SUBDIR_FRACTION
+    estimates = estimate_directory(source_dir, sample_fraction, recursive=recursive, matcher=matcher,
+                                   subdir_fraction=subdir_fraction)
+    if not estimates:
+        print("No files found to organize.")
+        return
+    
+    print(f"Estimate for {source_dir.resolve()} (± are 95% confidence intervals):")
+    print(f"{'Folder':<24}{'Files':>20}{'Sampled':>10}  Estimated size")
+    rows = sorted(estimates.items()) + [('Total', total_estimate(estimates))]
+    for folder, estimate in rows:
+        count_text = f"{estimate.count:,}"
+        if estimate.count_margin:
+            count_text += f" ± {estimate.count_margin:,.0f}"
+        size_text = format_size(estimate.size)
+        if estimate.margin:
+            size_text += f" ± {format_size(estimate.margin)}"
+        print(f"{folder:<24}{count_text:>20}{estimate.sampled:>10,}  {size_text}")
+
+
+def query_history(history_db: Optional[str], name: Optional[str] = None,
+                  run_id: Optional[int] = None) -> None:
+    """Print where files named name went, what run run_id moved, or the recent runs."""
+    import time
+    from file_organizer_history import HISTORY_FILENAME, MoveHistory
+    
+    db_path = Path(history_db or HISTORY_FILENAME)
+    if not db_path.exists():
+        print(f"No move history found at {db_path}")
+        return
+    
+    def when(timestamp):
+        return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))
+    
+    history = MoveHistory(db_path)
+    try:
+        if name is None and run_id is None:
+            for rid, started, finished, source, moved in history.list_runs():
+                status = f"{moved} files moved" if finished else "unfinished"
+                print(f"Run {rid}  {when(started)}  {source}  ({status})")
+            return
+        
+        moves = history.find_by_name(name) if name is not None else history.find_by_run(run_id)
+        if not moves:
+            print("No matching moves found.")
+        for rid, moved_at, original, destination in moves:
+            print(f"{when(moved_at)}  run {rid}  {original} -> {destination}")
+    finally:
+        history.close()
+
+
+def extract_bundled(source_path: Optional[str], name: str) -> None:
+    """Restore a bundled file into its category folder."""
+    from file_organizer_bundles import extract_from_organized_folders
+    
+    setup_logging()
+    source_dir = get_source_directory(source_path)
+    if source_dir is None:
+        return
+    
+    try:
+        restored = extract_from_organized_folders(source_dir, name)
+    except OSError as e:
+        print(f"Error extracting {name}: {e}")
+        logging.error(f"Error extracting {name} from bundles in {source_dir}: {e}")
+        return
+    
+    if restored is None:
+        print(f"No bundled file named {name} was found.")
+    else:
+        print(f"Extracted {name} to {restored}")
+        logging.info(f"Extracted bundled file {name} to {restored}")
+
+
+def parse_args(argv: Optional[Sequence[str]] = None):
+    """Parse command line arguments."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Organize files into folders by type.")
+    parser.add_argument('source', nargs='?',
+                        help="directory to organize (prompted for if omitted)")
+    parser.add_argument('-r', '--recursive', action='store_true',
+                        help="also organize files in subfolders")
+    parser.add_argument('--ignore-file', metavar='PATH',
+                        help=f"extra gitignore-style exclusion file (in addition to {IGNORE_FILENAME})")
+    parser.add_argument('--target', metavar='DEST',
+                        help="organize into DEST (a folder or s3://bucket/prefix) instead of the source directory")
+    parser.add_argument('--endpoint-url', metavar='URL',
+                        help="S3-compatible endpoint for s3:// targets, e.g. http://localhost:9000")
+    parser.add_argument('--estimate', action='store_true',
+                        help="print sampled per-folder counts and sizes without moving anything")
+    parser.add_argument('--sample-fraction', type=fraction, metavar='F',
+                        help="fraction of files to stat for --estimate (default 0.01)")
+    parser.add_argument('--subdir-fraction', type=fraction, metavar='F',
+                        help="fraction of subfolders to list for a recursive --estimate (default 0.1)")
+    
+    throttling = parser.add_argument_group("throttling")
+    throttling.add_argument('--max-bytes-per-sec', type=positive_size, metavar='SIZE',
+                            help="limit data copied across devices, e.g. 20M")
+    throttling.add_argument('--max-files-per-sec', type=positive_number, metavar='N',
+                            help="limit the number of files moved per second")
+    throttling.add_argument('--max-load', type=positive_number, metavar='LOAD',
+                            help="pause while the 1-minute load average is above LOAD")
+    throttling.add_argument('--idle-io', action='store_true',
+                            help="run in the idle I/O scheduling class (Linux)")
+    
+    bundling = parser.add_argument_group("small-file bundling")
+    bundling.add_argument('--consolidate-below', type=parse_size, metavar='SIZE',
+                          help="pack organized files smaller than SIZE into per-category tar bundles")
+    bundling.add_argument('--bundle-size', type=parse_size, metavar='SIZE',
+                          help="start a new bundle once one reaches SIZE (default 1G)")
+    bundling.add_argument('--extract-bundled', metavar='NAME',
+                          help="restore the latest bundled copy of NAME and exit")
+    
+    history = parser.add_argument_group("move history")
+    history.add_argument('--history-db', metavar='PATH',
+                         help="move history database (default file_organizer_history.db)")
+    history.add_argument('--where', metavar='NAME',
+                         help="show where files named NAME were moved and exit")
+    history.add_argument('--run', type=int, metavar='N',
+                         help="show everything run N moved and exit")
+    history.add_argument('--runs', action='store_true',
+                         help="list recent runs and exit")
+    
+    tiering = parser.add_argument_group("tiering")
+    tiering.add_argument('--tier-to', metavar='DIR',
+                         help="move large or old organized files into the same folders under DIR")
+    tiering.add_argument('--tier-min-size', type=parse_size, metavar='SIZE',
+                         help="tier files of at least SIZE")
+    tiering.add_argument('--tier-older-than', type=float, metavar='DAYS',
+                         help="tier files not modified for DAYS days")
+    tiering.add_argument('--tier-by-atime', action='store_true',
+                         help="use last access time instead of modification time for --tier-older-than")
+    tiering.add_argument('--tier-streams', type=int, default=2, metavar='N',
+                         help="concurrent copies per device (default 2)")
+    tiering.add_argument('--tier-symlink', action='store_true',
+                         help="leave a symlink at the original location of tiered files")
+    args = parser.parse_args(argv)
+    
+    if args.tier_to and args.tier_min_size is None and args.tier_older_than is None:
+        parser.error("--tier-to needs --tier-min-size and/or --tier-older-than")
+    return args
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    """Command line entry point."""
+    args = parse_args(argv)
+    
+    if args.where is not None or args.run is not None or args.runs:
+        query_history(args.history_db, args.where, args.run)
+        return
+    
+    if args.estimate:
+        estimate_files(args.source, args.sample_fraction, args.recursive, args.ignore_file,
+                       args.subdir_fraction)
+        return
+    
+    if args.extract_bundled:
+        extract_bundled(args.source, args.extract_bundled)
+        return
+    
+    throttle = None
+    if args.max_bytes_per_sec or args.max_files_per_sec or args.max_load is not None:
+        from file_organizer_throttle import IOThrottle
+        throttle = IOThrottle(args.max_bytes_per_sec, args.max_files_per_sec, args.max_load)
+    
+    tier_policy = None
+    if args.tier_to:
+        from file_organizer_tiering import TieringPolicy
+        tier_policy = TieringPolicy(Path(args.tier_to), args.tier_min_size, args.tier_older_than,
+                                    args.tier_by_atime, args.tier_streams, args.tier_symlink)
+    
+    organize_files(args.source, throttle, args.consolidate_below, args.bundle_size,
+                   args.recursive, args.ignore_file, args.target, args.endpoint_url, tier_policy,
+                   args.history_db, args.idle_io)
 
 
 if __name__ == "__main__":
-    organize_files()
+    main()
 
 
 
@@ -0,0 +1,306 @@
+"""
+Small-file consolidation into per-category tar bundles.
+
+Files under a size threshold are appended to uncompressed tar bundles kept in a
+hidden '.bundles' folder inside their category folder. Each bundle has a sidecar
+index (one JSON record per line) holding the data offset and size of every member,
+so a file can be found and extracted with a single seek instead of walking the
+tar headers. Bundles roll over to a new file once they reach a configured size.
+"""
+
+import errno
+import json
+import logging
+import os
+import shutil
+import tarfile
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from file_organizer import get_destination_folder_name, move_file_no_clobber, should_skip_file
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+BUNDLE_DIR_NAME = '.bundles'
+BUNDLE_SUFFIX = '.tar'
+INDEX_SUFFIX = '.idx'
+DEFAULT_BUNDLE_SIZE = 1024 ** 3
+COPY_CHUNK_SIZE = 1024 * 1024
+# Bundled files are only removed once the bundle and index are on disk; sync every N files
+SYNC_BATCH = 256
+
+
+def _round_up_block(size: int) -> int:
+    """Round size up to a whole number of tar blocks."""
+    return -(-size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+
+
+def _bundle_path(bundle_dir: Path, category: str, number: int) -> Path:
+    """Return the path of bundle number for category."""
+    return bundle_dir / f"{category}-{number:04d}{BUNDLE_SUFFIX}"
+
+
+def _index_path(bundle_path: Path) -> Path:
+    """Return the sidecar index path for a bundle."""
+    return bundle_path.with_name(bundle_path.name + INDEX_SUFFIX)
+
+
+def read_index(bundle_path: Path) -> List[Dict]:
+    """Read the sidecar index entries of a bundle."""
+    index_path = _index_path(bundle_path)
+    if not index_path.exists():
+        return []
+    with open(index_path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _archive_size(data_end: int) -> int:
+    """Size of a bundle whose members end at data_end, including the end-of-archive marker."""
+    # Bundles are cut right after the two zero blocks instead of padding to a full record
+    return data_end + 2 * tarfile.BLOCKSIZE
+
+
+def _data_end(entries: List[Dict]) -> int:
+    """Offset just past the last member's data, where the next member is written."""
+    if not entries:
+        return 0
+    last = entries[-1]
+    return last['offset'] + _round_up_block(last['size'])
+
+
+def _list_bundles(bundle_dir: Path) -> List[Path]:
+    """Return the bundles in bundle_dir, oldest first."""
+    if not bundle_dir.is_dir():
+        return []
+    return sorted(bundle_dir.glob(f"*{BUNDLE_SUFFIX}"))
+
+
+class _BundleWriter:
+    """Appends files to the current bundle of one category, rolling over when full."""
+
+    def __init__(self, category_dir: Path, max_size: int):
+        self.category = category_dir.name
+        self.bundle_dir = category_dir / BUNDLE_DIR_NAME
+        self.max_size = max_size
+        self.bundle_dir.mkdir(exist_ok=True)
+
+        bundles = _list_bundles(self.bundle_dir)
+        self.number = int(bundles[-1].stem.rsplit('-', 1)[1]) if bundles else 1
+        self._open()
+
+    def _open(self) -> None:
+        self.path = _bundle_path(self.bundle_dir, self.category, self.number)
+        # O_CREAT without O_TRUNC, so a bundle another organizer just created is kept
+        fd = os.open(str(self.path), os.O_RDWR | os.O_CREAT | getattr(os, 'O_BINARY', 0), 0o666)
+        self.fileobj = os.fdopen(fd, 'r+b')
+        if fcntl is not None:
+            # Only one organizer may append to a bundle at a time
+            fcntl.flock(self.fileobj.fileno(), fcntl.LOCK_EX)
+        # Read after locking, since another writer may have appended while we waited
+        self.entries = read_index(self.path)
+        self._unsynced: List[str] = []
+        # Overwrite the previous end-of-archive marker
+        self.fileobj.seek(_data_end(self.entries))
+        self.tar = tarfile.open(fileobj=self.fileobj, mode='w', format=tarfile.PAX_FORMAT)
+        self.index = open(_index_path(self.path), 'a', encoding='utf-8')
+
+    def sync(self) -> None:
+        """Make everything added so far durable: bundle data first, then its index lines."""
+        self.fileobj.flush()
+        os.fsync(self.fileobj.fileno())
+        if self._unsynced:
+            self.index.write(''.join(self._unsynced))
+            self._unsynced = []
+        self.index.flush()
+        os.fsync(self.index.fileno())
+
+    def _close(self) -> None:
+        self.tar.close()
+        # tarfile pads to a 10 KiB record; drop that so bundle_max_size is a real bound
+        self.fileobj.truncate(self.tar.offset)
+        self.sync()
+        self.index.close()
+        self.fileobj.close()
+
+    def add(self, file_path: Path, throttle=None) -> Path:
+        """Append file_path to the bundle, returning the bundle it went into.
+
+        The file is durable in the bundle only after the next sync() or close().
+        """
+        tarinfo = self.tar.gettarinfo(str(file_path), arcname=file_path.name)
+        if not tarinfo.isreg():
+            # e.g. replaced by a symlink since the folder was scanned
+            raise OSError(errno.EINVAL, f"{file_path.name} is not a regular file")
+        header_size = len(tarinfo.tobuf(self.tar.format, self.tar.encoding, self.tar.errors))
+        member_end = self.tar.offset + header_size + _round_up_block(tarinfo.size)
+        if self.entries and _archive_size(member_end) > self.max_size:
+            self._close()
+            self.number += 1
+            self._open()
+
+        if throttle is not None:
+            throttle.wait_op()
+            throttle.wait_bytes(tarinfo.size)
+
+        start_position = self.fileobj.tell()
+        start_offset = self.tar.offset
+        try:
+            with open(file_path, 'rb') as f:
+                self.tar.addfile(tarinfo, f)
+                stat = os.fstat(f.fileno())
+                # addfile copies exactly tarinfo.size bytes, so a file that grew would be cut short
+                if stat.st_size != tarinfo.size or stat.st_mtime != tarinfo.mtime:
+                    raise OSError(errno.EAGAIN, f"{file_path.name} changed while it was being bundled")
+            self.fileobj.flush()
+        except BaseException:
+            # Drop the partly written member so later members land where the index says
+            self.fileobj.seek(start_position)
+            self.fileobj.truncate()
+            self.tar.offset = start_offset
+            raise
+
+        entry = {
+            'name': file_path.name,
+            'offset': self.tar.offset - _round_up_block(tarinfo.size),
+            'size': tarinfo.size,
+            'mtime': tarinfo.mtime,
+        }
+        self.entries.append(entry)
+        self._unsynced.append(json.dumps(entry) + '\n')
+        return self.path
+
+    def close(self) -> None:
+        self._close()
+
+
+def _remove_bundled(bundled: List[Tuple[Path, Path]], history=None) -> int:
+    """Remove originals whose bundle copy is on disk, returning how many were removed."""
+    removed = 0
+    for item, bundle_path in bundled:
+        try:
+            item.unlink()
+        except OSError as e:
+            print(f"Error removing bundled file {item.name}: {e}")
+            logging.error(f"Error removing {item} after bundling it into {bundle_path}: {e}")
+            continue
+        if history is not None:
+            # Recorded as <bundle>/<member> so lookups point into the bundle
+            history.record(item, str(bundle_path / item.name))
+        removed += 1
+    return removed
+
+
+def consolidate_small_files(category_dir: Path, size_threshold: int,
+                            bundle_max_size: int = DEFAULT_BUNDLE_SIZE, throttle=None, history=None) -> int:
+    """Pack organized files smaller than size_threshold into the category's bundles.
+
+    Only files that belong in category_dir (by their extension) are packed, so user
+    folders that happen to live next to the category folders are left alone.
+    Symlinks, such as the stubs left by tiering, are never packed.
+    Returns the number of files consolidated.
+    """
+    candidates = []
+    with os.scandir(category_dir) as entries:
+        for entry in entries:
+            if (entry.is_file(follow_symlinks=False) and not should_skip_file(Path(entry.name))
+                    and get_destination_folder_name(os.path.splitext(entry.name)[1].lower()) == category_dir.name
+                    and entry.stat(follow_symlinks=False).st_size < size_threshold):
+                candidates.append(Path(entry.path))
+
+    if not candidates:
+        return 0
+
+    consolidated = 0
+    bundled: List[Tuple[Path, Path]] = []
+    writer = _BundleWriter(category_dir, bundle_max_size)
+    try:
+        for item in candidates:
+            try:
+                bundled.append((item, writer.add(item, throttle)))
+            except OSError as e:
+                print(f"Error bundling file {item.name}: {e}")
+                logging.error(f"Error bundling file {item} into {writer.path}: {e}")
+            if len(bundled) >= SYNC_BATCH:
+                writer.sync()
+                consolidated += _remove_bundled(bundled, history)
+                bundled = []
+    finally:
+        writer.close()
+    # close() has synced the rest
+    consolidated += _remove_bundled(bundled, history)
+
+    print(f"Bundled {consolidated} small files in {category_dir}")
+    logging.info(f"Bundled {consolidated} small files in {category_dir} (up to {writer.path.name})")
+    return consolidated
+
+
+def _find_in_index(bundle_path: Path, name: str) -> List[Dict]:
+    """Return the index entries for name in one bundle, oldest first."""
+    index_path = _index_path(bundle_path)
+    if not index_path.exists():
+        return []
+    # Index lines are written by json.dumps, so a substring test skips parsing non-matches
+    needle = f'"name": {json.dumps(name)}'
+    with open(index_path, encoding='utf-8') as f:
+        return [entry for entry in (json.loads(line) for line in f if needle in line) if entry['name'] == name]
+
+
+def find_bundled_file(category_dir: Path, name: str) -> List[Tuple[Path, Dict]]:
+    """Find all bundled copies of name in category_dir, oldest first."""
+    return [(bundle_path, entry)
+            for bundle_path in _list_bundles(category_dir / BUNDLE_DIR_NAME)
+            for entry in _find_in_index(bundle_path, name)]
+
+
+def find_latest_bundled_file(category_dir: Path, name: str) -> Optional[Tuple[Path, Dict]]:
+    """Find the most recently bundled copy of name, scanning bundles newest first."""
+    for bundle_path in reversed(_list_bundles(category_dir / BUNDLE_DIR_NAME)):
+        entries = _find_in_index(bundle_path, name)
+        if entries:
+            return bundle_path, entries[-1]
+    return None
+
+
+def extract_bundled_file(bundle_path: Path, entry: Dict, destination_dir: Path) -> Path:
+    """Extract one indexed member into destination_dir without overwriting, returning its path."""
+    temp_dir = Path(tempfile.mkdtemp(prefix='.', suffix='.organizer-tmp', dir=str(destination_dir)))
+    try:
+        temp_path = temp_dir / entry['name']
+        with open(bundle_path, 'rb') as src, open(temp_path, 'wb') as dst:
+            src.seek(entry['offset'])
+            remaining = entry['size']
+            while remaining > 0:
+                chunk = src.read(min(COPY_CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise OSError(f"Bundle {bundle_path} is truncated")
+                dst.write(chunk)
+                remaining -= len(chunk)
+        os.utime(temp_path, (entry['mtime'], entry['mtime']))
+        return move_file_no_clobber(temp_path, destination_dir)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def consolidate_organized_folders(source_dir: Path, size_threshold: int,
+                                  bundle_max_size: int = DEFAULT_BUNDLE_SIZE, throttle=None,
+                                  history=None) -> int:
+    """Run consolidate_small_files over every category folder in source_dir."""
+    total = 0
+    for item in sorted(source_dir.iterdir()):
+        if item.is_dir() and not should_skip_file(item):
+            total += consolidate_small_files(item, size_threshold, bundle_max_size, throttle, history)
+    return total
+
+
+def extract_from_organized_folders(source_dir: Path, name: str) -> Optional[Path]:
+    """Restore the most recently bundled copy of name into its category folder."""
+    category_dir = source_dir / get_destination_folder_name(Path(name).suffix.lower())
+    match = find_latest_bundled_file(category_dir, name)
+    if match is None:
+        return None
+    bundle_path, entry = match
+    return extract_bundled_file(bundle_path, entry, category_dir)
@@ -0,0 +1,180 @@
+"""
+Sampling-based pre-scan estimator for huge directories.
+
+A file's category comes from its name alone, so counting needs only a directory
+listing, while sizes need a stat() per file. The estimator samples both:
+
+* In recursive mode it does not walk the whole tree. At each level it descends
+  into a random subset of the subfolders and scales what it finds by the inverse
+  of the sampling rate (a multi-stage Horvitz-Thompson estimate), so counts are
+  estimated too.
+* Among the files it does list, it stats only a random sample per category and
+  extrapolates the total size.
+
+Counts and sizes come with 95% confidence intervals. A single flat folder still
+has to be listed to count it, but that listing reads names only.
+"""
+
+import math
+import os
+import random
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from file_organizer import get_destination_folder_name, scan_directory
+from file_organizer_ignore import IgnoreMatcher
+
+DEFAULT_SAMPLE_FRACTION = 0.01
+MIN_SAMPLES_PER_CATEGORY = 30
+DEFAULT_SUBDIR_FRACTION = 0.1
+MIN_SUBDIRS = 10
+Z_95 = 1.96
+
+
+class CategoryEstimate(NamedTuple):
+    """Estimated totals for one category."""
+    count: int
+    sampled: int
+    size: float
+    margin: float  # half-width of the 95% confidence interval for size
+    count_margin: float = 0.0  # same for count; zero when every folder was listed
+
+    @property
+    def size_low(self) -> float:
+        return max(0.0, self.size - self.margin)
+
+    @property
+    def size_high(self) -> float:
+        return self.size + self.margin
+
+
+class _Subtree(NamedTuple):
+    """Per-category count estimates (and their variances) for one folder's subtree."""
+    counts: Dict[str, float]
+    variances: Dict[str, float]
+
+
+class _Walk:
+    """Sampled walk of the tree, collecting listed files with their inclusion weights."""
+
+    def __init__(self, rng: random.Random, subdir_fraction: float, min_subdirs: int,
+                 category_of: Callable[[str], str], recursive: bool, matcher: Optional[IgnoreMatcher]):
+        self.rng = rng
+        self.subdir_fraction = subdir_fraction
+        self.min_subdirs = max(2, min_subdirs)  # at least two for a variance estimate
+        self.category_of = category_of
+        self.recursive = recursive
+        self.matcher = matcher if matcher is not None else IgnoreMatcher()
+        # category -> [(entry, weight)]
+        self.pools: Dict[str, List[Tuple[os.DirEntry, float]]] = {}
+
+    def visit(self, directory: str, rel_dir: str, weight: float) -> _Subtree:
+        subdirs: List[Tuple[str, str]] = []
+        counts: Dict[str, float] = {}
+        for entry in scan_directory(directory, rel_dir, subdirs, self.recursive, self.matcher):
+            category = self.category_of(os.path.splitext(entry.name)[1].lower())
+            counts[category] = counts.get(category, 0) + 1
+            self.pools.setdefault(category, []).append((entry, weight))
+        variances = dict.fromkeys(counts, 0.0)
+        if not subdirs:
+            return _Subtree(counts, variances)
+
+        total = len(subdirs)
+        chosen = min(total, max(self.min_subdirs, math.ceil(total * self.subdir_fraction)))
+        scale = total / chosen
+        children = [self.visit(path, rel_path, weight * scale)
+                    for path, rel_path in self.rng.sample(subdirs, chosen)]
+
+        for category in {c for child in children for c in child.counts}:
+            child_counts = [child.counts.get(category, 0.0) for child in children]
+            counts[category] = counts.get(category, 0.0) + scale * sum(child_counts)
+            # Between-folder variance of the first stage plus the children's own variance
+            variance = scale * sum(child.variances.get(category, 0.0) for child in children)
+            if chosen < total:
+                mean = sum(child_counts) / chosen
+                spread = sum((c - mean) ** 2 for c in child_counts) / (chosen - 1)
+                variance += total * total * (1 - chosen / total) * spread / chosen
+            variances[category] = variances.get(category, 0.0) + variance
+        return _Subtree(counts, variances)
+
+
+def _estimate_category(pool: List[Tuple[os.DirEntry, float]], count: float, count_variance: float,
+                       sample_fraction: float, min_samples: int, rng: random.Random) -> CategoryEstimate:
+    """Extrapolate a category's total size from a sample of its listed files."""
+    sample_size = min(len(pool), max(min_samples, math.ceil(len(pool) * sample_fraction)))
+    sizes = []
+    weights = []
+    for entry, weight in rng.sample(pool, sample_size):
+        try:
+            sizes.append(entry.stat().st_size)
+            weights.append(weight)
+        except OSError:
+            # Vanished since listing; leave it out of the sample
+            continue
+
+    count_margin = Z_95 * math.sqrt(count_variance)
+    sampled = len(sizes)
+    if sampled == 0:
+        return CategoryEstimate(round(count), 0, 0.0, 0.0, count_margin)
+
+    # Files from sparsely sampled folders stand for more files, so weigh them more
+    mean = sum(w * s for w, s in zip(weights, sizes)) / sum(weights)
+    mean_variance = 0.0
+    if 2 <= sampled < len(pool):
+        spread = sum((s - mean) ** 2 for s in sizes) / (sampled - 1)
+        # Finite population correction, since we sample without replacement
+        mean_variance = spread / sampled * (len(pool) - sampled) / (len(pool) - 1)
+
+    size = count * mean
+    margin = Z_95 * math.sqrt(mean * mean * count_variance + count * count * mean_variance)
+    return CategoryEstimate(round(count), sampled, size, margin, count_margin)
+
+
+def estimate_directory(source_dir: Path, sample_fraction: float = DEFAULT_SAMPLE_FRACTION,
+                       min_samples: int = MIN_SAMPLES_PER_CATEGORY,
+                       category_of: Callable[[str], str] = get_destination_folder_name,
+                       seed: Optional[int] = None, recursive: bool = False,
+                       matcher: Optional[IgnoreMatcher] = None,
+                       subdir_fraction: float = DEFAULT_SUBDIR_FRACTION,
+                       min_subdirs: int = MIN_SUBDIRS) -> Dict[str, CategoryEstimate]:
+    """Estimate per-category file counts and sizes for source_dir.
+
+    category_of maps a lower-cased extension to the category label to group by.
+    In recursive mode each folder's subfolders are walked only in part: a random
+    max(min_subdirs, subdir_fraction * n) of them. Sizes are extrapolated from a
+    stratified random sample of max(min_samples, sample_fraction * n) of the
+    listed files per category.
+    """
+    rng = random.Random(seed)
+    walk = _Walk(rng, subdir_fraction, min_subdirs, category_of, recursive, matcher)
+    subtree = walk.visit(str(source_dir), '', 1.0)
+
+    return {
+        category: _estimate_category(pool, subtree.counts[category], subtree.variances[category],
+                                     sample_fraction, min_samples, rng)
+        for category, pool in walk.pools.items()
+    }
+
+
+def total_estimate(estimates: Dict[str, CategoryEstimate]) -> CategoryEstimate:
+    """Combine per-category estimates.
+
+    With exact counts the size samples are independent strata, so margins add in
+    quadrature. When folders were sampled, every category was estimated from the
+    same folders and the errors move together, so the margins are simply added,
+    which is a safe upper bound.
+    """
+    values = estimates.values()
+    if any(e.count_margin for e in values):
+        margin = sum(e.margin for e in values)
+        count_margin = sum(e.count_margin for e in values)
+    else:
+        margin = math.sqrt(sum(e.margin ** 2 for e in values))
+        count_margin = 0.0
+    return CategoryEstimate(
+        sum(e.count for e in values),
+        sum(e.sampled for e in values),
+        sum(e.size for e in values),
+        margin,
+        count_margin,
+    )
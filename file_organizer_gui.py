@@ -6,6 +6,7 @@ File Organizer GUI - A simple graphical interface for organizing files
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import threading
+import time
 from pathlib import Path
 import os
 from collections import defaultdict
@@ -17,10 +18,11 @@ from file_organizer import (
     FILE_CATEGORIES, 
     get_file_category, 
     get_destination_folder_name,
+    iter_file_entries,
     create_destination_directory,
-    get_unique_filename,
-    should_skip_file,
-    setup_logging
+    move_file_no_clobber,
+    setup_logging,
+    format_size
 )
 
 
@@ -35,6 +37,16 @@ class FileOrganizerGUI:
         self.organization_stats = {}
         self.files_to_organize = {}
         self.is_organizing = False
+        self.throttle = None
+        self.use_idle_io = False
+        self.max_mb_per_sec = tk.StringVar()
+        self.max_files_per_sec = tk.StringVar()
+        self.max_load = tk.StringVar()
+        self.idle_io = tk.BooleanVar(value=False)
+        self.recursive = tk.BooleanVar(value=False)
+        # Incremented per scan so results from an older scan's threads are ignored
+        self.scan_generation = 0
+        self.scan_estimates = None
         
         # Setup logging
         setup_logging()
@@ -72,6 +84,9 @@ class FileOrganizerGUI:
                                      state='disabled')
         self.scan_button.pack(side='left', padx=(10, 0))
         
+        ttk.Checkbutton(dir_frame, text="Include subfolders (skipping paths in .organizerignore)",
+                        variable=self.recursive).pack(anchor='w', padx=10, pady=(0, 10))
+        
         # Preview section
         preview_frame = ttk.LabelFrame(main_frame, text="Preview - Files to be Organized")
         preview_frame.pack(fill='both', expand=True, pady=(0, 15))
@@ -101,6 +116,21 @@ class FileOrganizerGUI:
         tree_scroll_y.pack(side='right', fill='y')
         tree_scroll_x.pack(side='bottom', fill='x')
         
+        # Throttling section
+        throttle_frame = ttk.LabelFrame(main_frame, text="Low-Impact Mode (leave blank for no limit)")
+        throttle_frame.pack(fill='x', pady=(0, 15))
+        
+        throttle_inner = ttk.Frame(throttle_frame)
+        throttle_inner.pack(fill='x', padx=10, pady=10)
+        
+        ttk.Label(throttle_inner, text="Max MB/s:").pack(side='left')
+        ttk.Entry(throttle_inner, textvariable=self.max_mb_per_sec, width=6).pack(side='left', padx=(5, 15))
+        ttk.Label(throttle_inner, text="Max files/s:").pack(side='left')
+        ttk.Entry(throttle_inner, textvariable=self.max_files_per_sec, width=6).pack(side='left', padx=(5, 15))
+        ttk.Label(throttle_inner, text="Pause above load:").pack(side='left')
+        ttk.Entry(throttle_inner, textvariable=self.max_load, width=6).pack(side='left', padx=(5, 15))
+        ttk.Checkbutton(throttle_inner, text="Idle I/O priority", variable=self.idle_io).pack(side='left')
+        
         # Control buttons section
         button_frame = ttk.Frame(main_frame)
         button_frame.pack(pady=(0, 15))
@@ -177,9 +207,16 @@ class FileOrganizerGUI:
             # Clear previous results
             self.tree.delete(*self.tree.get_children())
             self.files_to_organize.clear()
+            self.scan_generation += 1
+            self.scan_estimates = None
             
-            # Scan files in a separate thread to keep UI responsive
-            threading.Thread(target=self._scan_files_thread, args=(directory,), daemon=True).start()
+            # Estimate and scan in separate threads to keep UI responsive; the quick
+            # sampled estimate runs alongside the exact scan and gives it a scale
+            recursive = self.recursive.get()
+            threading.Thread(target=self._estimate_thread, args=(directory, recursive, self.scan_generation),
+                             daemon=True).start()
+            threading.Thread(target=self._scan_files_thread, args=(directory, recursive, self.scan_generation),
+                             daemon=True).start()
             
         except Exception as e:
             messagebox.showerror("Error", f"Failed to scan directory: {str(e)}")
@@ -187,45 +224,125 @@ class FileOrganizerGUI:
             self.progress_bar.config(mode='determinate')
             self.progress_var.set("Ready to organize files...")
             
-    def _scan_files_thread(self, directory):
+    def _estimate_thread(self, directory, recursive, generation):
+        """Compute a sampled estimate in a separate thread."""
+        try:
+            from file_organizer_estimate import estimate_directory
+            estimates = estimate_directory(Path(directory), category_of=self._preview_category,
+                                           recursive=recursive)
+        except Exception as e:
+            # The exact scan still runs, so an estimate failure is not fatal
+            logging.warning(f"Estimate of {directory} failed: {e}")
+            return
+        self.root.after(0, self._show_estimate, generation, estimates)
+        
+    def _scan_files_thread(self, directory, recursive=False, generation=0):
         """Scan files in a separate thread."""
         try:
             source_dir = Path(directory)
             file_groups = defaultdict(list)
+            totals = defaultdict(lambda: [0, 0])
             total_files = 0
+            next_update = time.monotonic() + 0.25
             
             # Group files by category
-            for file_path in source_dir.iterdir():
-                if file_path.is_file() and not should_skip_file(file_path):
-                    extension = file_path.suffix.lower()
-                    category = get_file_category(extension)
-                    if category == 'Others':
-                        category = f"{extension[1:].upper()} Files" if extension else "Unknown"
-                    
-                    file_info = {
-                        'path': file_path,
-                        'name': file_path.name,
-                        'size': file_path.stat().st_size,
-                        'extension': extension,
-                        'destination_folder': get_destination_folder_name(extension)
-                    }
-                    
-                    file_groups[category].append(file_info)
-                    total_files += 1
-            
-            self.files_to_organize = file_groups
+            for entry in iter_file_entries(source_dir, recursive):
+                file_path = Path(entry.path)
+                extension = file_path.suffix.lower()
+                category = self._preview_category(extension)
+                
+                file_info = {
+                    'path': file_path,
+                    'name': file_path.name,
+                    'size': entry.stat().st_size,
+                    'extension': extension,
+                    'destination_folder': get_destination_folder_name(extension)
+                }
+                
+                file_groups[category].append(file_info)
+                totals[category][0] += 1
+                totals[category][1] += file_info['size']
+                total_files += 1
+                
+                if time.monotonic() >= next_update:
+                    next_update = time.monotonic() + 0.25
+                    snapshot = {name: tuple(values) for name, values in totals.items()}
+                    self.root.after(0, self._show_scan_progress, generation, snapshot, total_files)
             
             # Update UI in main thread
-            self.root.after(0, self._update_preview, file_groups, total_files)
+            self.root.after(0, self._update_preview, generation, file_groups, total_files)
             
         except Exception as e:
             self.root.after(0, lambda: messagebox.showerror("Error", f"Failed to scan files: {str(e)}"))
             self.root.after(0, self._reset_progress)
             
-    def _update_preview(self, file_groups, total_files):
+    @staticmethod
+    def _preview_category(extension):
+        """Return the preview label for files with the given extension."""
+        category = get_file_category(extension)
+        if category == 'Others':
+            category = f"{extension[1:].upper()} Files" if extension else "Unknown"
+        return category
+        
+    def _show_estimate(self, generation, estimates):
+        """Show sampled estimates in the preview tree until the exact scan catches up."""
+        if generation != self.scan_generation or not estimates:
+            return
+        self.scan_estimates = estimates
+        # Once the scan has reported progress, its next update shows the estimate alongside
+        if self.tree.get_children():
+            return
+        for category, estimate in sorted(estimates.items()):
+            size_str = f"~{self._format_size(estimate.size)}"
+            if estimate.margin:
+                size_str += f" ± {self._format_size(estimate.margin)}"
+            self.tree.insert('', 'end', text=category, values=(f"~{estimate.count}", size_str))
+        
+        from file_organizer_estimate import total_estimate
+        total = total_estimate(estimates)
+        self.progress_var.set(
+            f"Estimated ~{total.count} files, ~{self._format_size(total.size)} "
+            f"in {len(estimates)} categories. Scanning..."
+        )
+        
+    def _show_scan_progress(self, generation, totals, scanned):
+        """Show the exact scan's running totals, against the estimate when there is one."""
+        if generation != self.scan_generation:
+            return
+        estimates = self.scan_estimates or {}
+        self.tree.delete(*self.tree.get_children())
+        for category in sorted(set(totals) | set(estimates)):
+            count, size = totals.get(category, (0, 0))
+            estimate = estimates.get(category)
+            if estimate is not None:
+                values = (f"{count} of ~{estimate.count}",
+                          f"{self._format_size(size)} of ~{self._format_size(estimate.size)}")
+            else:
+                values = (count, self._format_size(size))
+            self.tree.insert('', 'end', text=category, values=values)
+        
+        if estimates:
+            from file_organizer_estimate import total_estimate
+            expected = total_estimate(estimates).count
+            if expected:
+                # The estimate can be low, so never show the bar as full before the scan ends
+                percent = min(99, 100 * scanned // expected)
+                self.progress_bar.stop()
+                self.progress_bar.config(mode='determinate', value=percent)
+                self.progress_var.set(f"Scanned {scanned} of ~{expected} files ({percent}%)...")
+                return
+        self.progress_var.set(f"Scanned {scanned} files...")
+            
+    def _update_preview(self, generation, file_groups, total_files):
         """Update the preview tree with scanned files."""
+        if generation != self.scan_generation:
+            return
+        # Invalidate any estimate or progress update still in flight
+        self.scan_generation += 1
+        self.files_to_organize = file_groups
+        self.tree.delete(*self.tree.get_children())
         self.progress_bar.stop()
-        self.progress_bar.config(mode='determinate')
+        self.progress_bar.config(mode='determinate', value=0)
         
         if not file_groups:
             self.progress_var.set("No files found to organize.")
@@ -284,6 +401,13 @@ class FileOrganizerGUI:
             messagebox.showerror("Error", "No files to organize. Please scan a directory first.")
             return
             
+        try:
+            self.throttle = self._build_throttle()
+            self.use_idle_io = self.idle_io.get()
+        except ValueError:
+            messagebox.showerror("Error", "Throttling limits must be positive numbers.")
+            return
+            
         # Confirm organization
         total_files = sum(len(files) for files in self.files_to_organize.values())
         if not messagebox.askyesno(
@@ -300,15 +424,47 @@ class FileOrganizerGUI:
         # Start organization in separate thread
         threading.Thread(target=self._organize_files_thread, daemon=True).start()
         
+    def _build_throttle(self):
+        """Create an IOThrottle from the low-impact mode fields, or None if no limit is set."""
+        from file_organizer_throttle import IOThrottle
+        
+        def read_limit(var):
+            text = var.get().strip()
+            if not text:
+                return None
+            value = float(text)
+            if value <= 0:
+                raise ValueError(text)
+            return value
+        
+        mb_per_sec = read_limit(self.max_mb_per_sec)
+        files_per_sec = read_limit(self.max_files_per_sec)
+        max_load = read_limit(self.max_load)
+        if mb_per_sec is None and files_per_sec is None and max_load is None:
+            return None
+        bytes_per_sec = mb_per_sec * 1024 * 1024 if mb_per_sec else None
+        return IOThrottle(bytes_per_sec, files_per_sec, max_load)
+        
     def _organize_files_thread(self):
         """Organize files in a separate thread."""
+        history = None
         try:
+            if self.use_idle_io:
+                # ioprio applies to the calling thread, so set it on the worker
+                from file_organizer_throttle import set_io_priority
+                set_io_priority()
+                
             source_dir = Path(self.selected_directory.get())
             total_files = sum(len(files) for files in self.files_to_organize.values())
             processed_files = 0
             stats = defaultdict(int)
             errors = []
             
+            # Record every move so lost files can be looked up later
+            from file_organizer_history import MoveHistory
+            history = MoveHistory()
+            history.start_run(source_dir)
+            
             for category, files in self.files_to_organize.items():
                 for file_info in files:
                     try:
@@ -323,12 +479,16 @@ class FileOrganizerGUI:
                         dest_dir = create_destination_directory(source_dir, dest_folder)
                         
                         if dest_dir:
-                            # Get unique filename
-                            unique_name = get_unique_filename(dest_dir, file_info['name'])
-                            dest_path = dest_dir / unique_name
+                            if self.throttle is not None:
+                                self.throttle.wait_op()
                             
-                            # Move file
-                            file_info['path'].rename(dest_path)
+                            # Move file, renaming on collision
+                            dest_path = move_file_no_clobber(
+                                file_info['path'], dest_dir, self.throttle,
+                                self._make_byte_progress(file_info['name'], processed_files, total_files)
+                            )
+                            unique_name = dest_path.name
+                            history.record(file_info['path'], str(dest_path))
                             stats[dest_folder] += 1
                             
                             # Log the move
@@ -343,14 +503,28 @@ class FileOrganizerGUI:
                         
                     processed_files += 1
             
+            history.finish_run(sum(stats.values()))
+            
             # Update UI with results
             self.root.after(0, self._show_results, stats, errors, total_files)
             
         except Exception as e:
             self.root.after(0, lambda: messagebox.showerror("Error", f"Organization failed: {str(e)}"))
         finally:
+            if history is not None:
+                history.close()
             self.root.after(0, self._finish_organization)
             
+    def _make_byte_progress(self, name, processed_files, total_files):
+        """Return a callback that shows byte progress of a large file transfer."""
+        def report(done, total):
+            fraction = done / total if total else 1.0
+            progress = (processed_files + fraction) / total_files * 100
+            text = f"Organizing: {name} ({self._format_size(done)} of {self._format_size(total)})"
+            self.root.after(0, lambda: self.progress_bar.config(value=progress))
+            self.root.after(0, lambda: self.progress_var.set(text))
+        return report
+            
     def _show_results(self, stats, errors, total_files):
         """Display organization results."""
         self.results_text.config(state='normal')
@@ -409,14 +583,7 @@ class FileOrganizerGUI:
     @staticmethod
     def _format_size(size_bytes):
         """Format file size in human readable format."""
-        if size_bytes == 0:
-            return "0 B"
-        size_names = ["B", "KB", "MB", "GB", "TB"]
-        i = 0
-        while size_bytes >= 1024 and i < len(size_names) - 1:
-            size_bytes /= 1024.0
-            i += 1
-        return f"{size_bytes:.1f} {size_names[i]}"
+        return format_size(size_bytes)
 
 
 def main():
@@ -0,0 +1,174 @@
+"""
+Searchable history of where the organizer moved each file.
+
+Moves are written in batches to an SQLite database with one row per move. Folder
+paths are stored once in a separate table and referenced by id, which keeps rows
+small. Indexes on the original name, the destination name and the run id make
+"where did X go" and "what did run N move" index lookups instead of log greps.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+HISTORY_FILENAME = 'file_organizer_history.db'
+BATCH_SIZE = 1000
+# Files SQLite keeps next to the database while it is open
+SIDECAR_SUFFIXES = ('-wal', '-shm', '-journal')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started REAL NOT NULL,
+    finished REAL,
+    source TEXT NOT NULL,
+    moved INTEGER
+);
+CREATE TABLE IF NOT EXISTS folders (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS moves (
+    run_id INTEGER NOT NULL,
+    moved_at REAL NOT NULL,
+    name TEXT NOT NULL,
+    source_folder INTEGER NOT NULL,
+    destination_folder INTEGER NOT NULL,
+    destination_name TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS moves_by_name ON moves (name);
+CREATE INDEX IF NOT EXISTS moves_by_destination ON moves (destination_name);
+CREATE INDEX IF NOT EXISTS moves_by_run ON moves (run_id);
+"""
+
+_MOVE_QUERY = """
+SELECT m.run_id, m.moved_at, src.path, m.name, dst.path, m.destination_name
+FROM moves m
+JOIN folders src ON src.id = m.source_folder
+JOIN folders dst ON dst.id = m.destination_folder
+"""
+
+# (run_id, moved_at, original path, destination)
+MoveRecord = Tuple[int, float, str, str]
+
+
+def _split(location: str) -> Tuple[str, str]:
+    """Split a local path or URL into (folder, name)."""
+    if '://' in location:
+        folder, _, name = location.rpartition('/')
+        return folder, name
+    return os.path.split(location)
+
+
+def _join(folder: str, name: str) -> str:
+    if '://' in folder:
+        return f"{folder}/{name}"
+    return os.path.join(folder, name)
+
+
+class MoveHistory:
+    """Batched writer and query interface for the move history database."""
+
+    def __init__(self, db_path: Path = Path(HISTORY_FILENAME)):
+        self.db_path = db_path
+        # Moves may be recorded from worker threads (S3 uploads, tiering)
+        self.connection = sqlite3.connect(str(db_path), check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(_SCHEMA)
+        self.run_id: Optional[int] = None
+        self._pending: List[Tuple] = []
+        self._folder_ids: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    # -- Writing ----------------------------------------------------------
+
+    def start_run(self, source_dir: Path) -> int:
+        """Register a new run and return its id."""
+        with self._lock, self.connection:
+            cursor = self.connection.execute(
+                'INSERT INTO runs (started, source) VALUES (?, ?)', (time.time(), str(source_dir.resolve()))
+            )
+        self.run_id = cursor.lastrowid
+        return self.run_id
+
+    def _folder_id(self, path: str) -> int:
+        folder_id = self._folder_ids.get(path)
+        if folder_id is None:
+            self.connection.execute('INSERT OR IGNORE INTO folders (path) VALUES (?)', (path,))
+            folder_id = self.connection.execute('SELECT id FROM folders WHERE path = ?', (path,)).fetchone()[0]
+            self._folder_ids[path] = folder_id
+        return folder_id
+
+    def database_files(self) -> Set[str]:
+        """Return the real paths of the database and its sidecar files, which must not be moved."""
+        database = os.path.realpath(str(self.db_path))
+        return {database} | {database + suffix for suffix in SIDECAR_SUFFIXES}
+
+    def record(self, source_file: Path, destination: str) -> None:
+        """Queue one move; rows are written every BATCH_SIZE moves and on flush()."""
+        source_folder, name = _split(str(source_file.resolve()))
+        if '://' not in destination:
+            # Callers pass paths relative to wherever they were started from
+            destination = os.path.abspath(destination)
+        destination_folder, destination_name = _split(destination)
+        with self._lock:
+            self._pending.append((time.time(), name, source_folder, destination_folder, destination_name))
+            if len(self._pending) >= BATCH_SIZE:
+                self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        if not self._pending:
+            return
+        with self.connection:
+            rows = [
+                (self.run_id, moved_at, name, self._folder_id(source_folder),
+                 self._folder_id(destination_folder), destination_name)
+                for moved_at, name, source_folder, destination_folder, destination_name in self._pending
+            ]
+            self.connection.executemany(
+                'INSERT INTO moves (run_id, moved_at, name, source_folder, destination_folder, destination_name) '
+                'VALUES (?, ?, ?, ?, ?, ?)', rows
+            )
+        self._pending = []
+
+    def flush(self) -> None:
+        """Write any queued moves."""
+        with self._lock:
+            self._flush_locked()
+
+    def finish_run(self, moved: int) -> None:
+        """Flush queued moves and mark the current run as finished."""
+        with self._lock:
+            self._flush_locked()
+            with self.connection:
+                self.connection.execute('UPDATE runs SET finished = ?, moved = ? WHERE id = ?',
+                                        (time.time(), moved, self.run_id))
+
+    def close(self) -> None:
+        self.flush()
+        self.connection.close()
+
+    # -- Queries ----------------------------------------------------------
+
+    def _moves(self, where: str, params: Tuple) -> List[MoveRecord]:
+        rows = self.connection.execute(f"{_MOVE_QUERY} WHERE {where} ORDER BY m.moved_at", params)
+        return [(run_id, moved_at, _join(source_folder, name), _join(destination_folder, destination_name))
+                for run_id, moved_at, source_folder, name, destination_folder, destination_name in rows]
+
+    def find_by_name(self, name: str) -> List[MoveRecord]:
+        """Return moves of files originally named name, or now named name at their destination."""
+        return self._moves('m.name = ? OR m.destination_name = ?', (name, name))
+
+    def find_by_run(self, run_id: int) -> List[MoveRecord]:
+        """Return every move made by run run_id."""
+        return self._moves('m.run_id = ?', (run_id,))
+
+    def list_runs(self, limit: int = 20) -> List[Tuple[int, float, Optional[float], str, Optional[int]]]:
+        """Return the most recent runs as (id, started, finished, source, moved), newest first."""
+        return self.connection.execute(
+            'SELECT id, started, finished, source, moved FROM runs ORDER BY id DESC LIMIT ?', (limit,)
+        ).fetchall()
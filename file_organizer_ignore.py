@@ -0,0 +1,142 @@
+"""
+Gitignore-style exclusion rules for the organizer.
+
+Patterns are read from '.organizerignore' files and compiled once into regular
+expressions. The syntax follows .gitignore:
+
+- blank lines and lines starting with '#' are ignored
+- a leading '!' re-includes paths excluded by an earlier pattern
+- a trailing '/' only matches directories
+- a pattern containing '/' is anchored to the folder holding the ignore file,
+  otherwise it matches a name at any depth
+- '*' and '?' never match '/', '**' matches across folders
+- the last matching pattern wins
+"""
+
+import re
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Pattern
+
+IGNORE_FILENAME = '.organizerignore'
+
+# Always excluded; hidden folders such as .git are already skipped by should_skip_file
+DEFAULT_IGNORE_PATTERNS = [
+    'node_modules/',
+    '__pycache__/',
+    '~snapshot/',
+    '@eaDir/',
+]
+
+
+class IgnoreRule(NamedTuple):
+    """A single compiled ignore pattern."""
+    regex: Pattern
+    negate: bool
+    dir_only: bool
+    base: str  # folder (relative, '/'-separated) the pattern is anchored to
+
+
+def _translate(pattern: str) -> str:
+    """Translate a gitignore glob (without '!' or trailing '/') into a regex body."""
+    anchored = '/' in pattern
+    pattern = pattern.lstrip('/')
+
+    parts = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if pattern.startswith('**/', i):
+            parts.append('(?:.*/)?')
+            i += 3
+        elif pattern.startswith('/**', i) and i + 3 == len(pattern):
+            parts.append('/.*')
+            i += 3
+        elif pattern.startswith('**', i):
+            parts.append('.*')
+            i += 2
+        elif c == '*':
+            parts.append('[^/]*')
+            i += 1
+        elif c == '?':
+            parts.append('[^/]')
+            i += 1
+        elif c == '[':
+            end = pattern.find(']', i + 2)
+            if end == -1:
+                parts.append(re.escape(c))
+                i += 1
+                continue
+            body = pattern[i + 1:end]
+            if body.startswith('!'):
+                body = '^' + body[1:]
+            parts.append('[' + body.replace('\\', '\\\\') + ']')
+            i = end + 1
+        elif c == '\\' and i + 1 < len(pattern):
+            parts.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            parts.append(re.escape(c))
+            i += 1
+
+    body = ''.join(parts)
+    # Unanchored patterns match a name at any depth
+    return body if anchored else '(?:.*/)?' + body
+
+
+def compile_pattern(line: str, base: str = '') -> Optional[IgnoreRule]:
+    """Compile one ignore file line, returning None for blanks and comments."""
+    line = line.rstrip('\n').rstrip('\r')
+    # Trailing spaces are ignored unless escaped
+    if not line.endswith('\\ '):
+        line = line.rstrip(' ')
+    if not line or line.startswith('#'):
+        return None
+
+    negate = line.startswith('!')
+    if negate:
+        line = line[1:]
+    elif line.startswith('\\!') or line.startswith('\\#'):
+        line = line[1:]
+
+    dir_only = line.endswith('/')
+    line = line.rstrip('/')
+    if not line:
+        return None
+
+    regex = re.compile(_translate(line) + r'\Z', re.DOTALL)
+    return IgnoreRule(regex, negate, dir_only, base)
+
+
+class IgnoreMatcher:
+    """Ordered set of compiled ignore rules, matched against '/'-separated relative paths."""
+
+    def __init__(self, patterns: Optional[List[str]] = None):
+        self.rules: List[IgnoreRule] = []
+        for pattern in DEFAULT_IGNORE_PATTERNS if patterns is None else patterns:
+            self.add_pattern(pattern)
+
+    def add_pattern(self, pattern: str, base: str = '') -> None:
+        """Add a single pattern anchored at base."""
+        rule = compile_pattern(pattern, base)
+        if rule is not None:
+            self.rules.append(rule)
+
+    def add_file(self, ignore_file: Path, base: str = '') -> None:
+        """Add all patterns from an ignore file whose folder is base (relative to the scan root)."""
+        with open(ignore_file, encoding='utf-8', errors='replace') as f:
+            for line in f:
+                self.add_pattern(line, base)
+
+    def matches(self, rel_path: str, is_dir: bool) -> bool:
+        """Return True if rel_path (relative to the scan root) is excluded."""
+        for rule in reversed(self.rules):
+            if rule.dir_only and not is_dir:
+                continue
+            path = rel_path
+            if rule.base:
+                if not rel_path.startswith(rule.base + '/'):
+                    continue
+                path = rel_path[len(rule.base) + 1:]
+            if rule.regex.match(path):
+                return not rule.negate
+        return False
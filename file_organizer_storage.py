@@ -0,0 +1,467 @@
+"""
+Pluggable storage backends for organized files.
+
+A backend receives files together with the category folder they belong in.
+LocalStorageBackend writes into a folder on a local or mounted filesystem, using
+the same no-clobber moves as the command-line organizer. S3StorageBackend uploads
+into an S3-compatible bucket (AWS S3, MinIO, Ceph RGW, ...) over a pool of
+keep-alive connections, splits large files into concurrently uploaded parts and
+replaces the per-file exists() probe with one listing per folder.
+"""
+
+import abc
+import datetime
+import hashlib
+import hmac
+import http.client
+import logging
+import os
+import threading
+import urllib.parse
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from file_organizer import create_destination_directory, move_file
+
+DEFAULT_MAX_CONNECTIONS = 8
+DEFAULT_PART_SIZE = 16 * 1024 * 1024
+MIN_PART_SIZE = 5 * 1024 * 1024  # S3 rejects smaller parts (except the last)
+REQUEST_TIMEOUT = 60
+EMPTY_SHA256 = hashlib.sha256(b'').hexdigest()
+
+
+class StorageBackend(abc.ABC):
+    """Destination for organized files."""
+
+    @abc.abstractmethod
+    def describe(self, folder_name: str) -> str:
+        """Return a human readable location for folder_name."""
+
+    @abc.abstractmethod
+    def create_folder(self, folder_name: str) -> bool:
+        """Make sure folder_name can receive files, returning False on failure."""
+
+    @abc.abstractmethod
+    def move_file(self, source_file: Path, folder_name: str) -> bool:
+        """Move source_file into folder_name without overwriting, returning True on success."""
+
+    def move_files(self, items: Iterable[Tuple[Path, str]]) -> int:
+        """Move (source_file, folder_name) pairs, returning how many were moved."""
+        moved = 0
+        for source_file, folder_name in items:
+            if self.create_folder(folder_name) and self.move_file(source_file, folder_name):
+                moved += 1
+        return moved
+
+    def close(self) -> None:
+        """Release any resources held by the backend."""
+
+
+class LocalStorageBackend(StorageBackend):
+    """Organize into category folders under base_dir on a local filesystem."""
+
+    def __init__(self, base_dir: Path, throttle=None, history=None):
+        self.base_dir = base_dir
+        self.throttle = throttle
+        self.history = history
+
+    def describe(self, folder_name: str) -> str:
+        return str(self.base_dir / folder_name)
+
+    def create_folder(self, folder_name: str) -> bool:
+        return create_destination_directory(self.base_dir, folder_name) is not None
+
+    def move_file(self, source_file: Path, folder_name: str) -> bool:
+        return move_file(source_file, self.base_dir / folder_name, self.throttle, self.history)
+
+
+class S3Error(OSError):
+    """Error response from an S3-compatible server."""
+
+    def __init__(self, status: int, code: str, message: str):
+        super().__init__(f"{status} {code}: {message}")
+        self.status = status
+        self.code = code
+
+
+class ConnectionPool:
+    """Thread-safe pool of keep-alive HTTP connections to one host."""
+
+    def __init__(self, scheme: str, netloc: str, max_idle: int = DEFAULT_MAX_CONNECTIONS):
+        self.connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        self.netloc = netloc
+        self.max_idle = max_idle
+        self._idle: List[http.client.HTTPConnection] = []
+        self._lock = threading.Lock()
+
+    def acquire(self) -> Tuple[http.client.HTTPConnection, bool]:
+        """Return (connection, reused): an idle connection, or a new one if none is free."""
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+        return self.connection_class(self.netloc, timeout=REQUEST_TIMEOUT), False
+
+    def release(self, connection: http.client.HTTPConnection) -> None:
+        """Return a healthy connection to the pool."""
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(connection)
+                return
+        connection.close()
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+
+def _uri_encode(text: str, safe: str = '-_.~') -> str:
+    return urllib.parse.quote(text, safe=safe)
+
+
+def _is_name_collision(error: S3Error) -> bool:
+    """Whether a conditional write failed because the object already exists."""
+    return error.status in (409, 412) or error.code in ('PreconditionFailed', 'ConditionalRequestConflict')
+
+
+def _multipart_etag(part_etags: List[str]) -> str:
+    """The ETag S3 gives a completed multipart upload: MD5 of the part MD5s, plus the part count."""
+    digests = b''.join(bytes.fromhex(etag.strip('"')) for etag in part_etags)
+    return f'"{hashlib.md5(digests).hexdigest()}-{len(part_etags)}"'
+
+
+def _xml_find_all(root: ET.Element, tag: str) -> List[ET.Element]:
+    """Find descendants by local name, ignoring the S3 XML namespace."""
+    return [element for element in root.iter() if element.tag.rsplit('}', 1)[-1] == tag]
+
+
+def _xml_text(root: ET.Element, tag: str) -> Optional[str]:
+    found = _xml_find_all(root, tag)
+    return found[0].text if found else None
+
+
+class S3StorageBackend(StorageBackend):
+    """Organize into an S3-compatible bucket, under prefix/<category>/<name>.
+
+    Requests are signed with AWS Signature Version 4 and use path-style addressing,
+    so any S3-compatible endpoint (including a local stand-in server) works.
+    Credentials default to the usual AWS_* environment variables.
+    """
+
+    def __init__(self, bucket: str, prefix: str = '', endpoint_url: Optional[str] = None,
+                 region: Optional[str] = None, access_key: Optional[str] = None,
+                 secret_key: Optional[str] = None, session_token: Optional[str] = None,
+                 throttle=None, max_connections: int = DEFAULT_MAX_CONNECTIONS,
+                 part_size: int = DEFAULT_PART_SIZE, history=None):
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        self.region = region or os.environ.get('AWS_REGION') or os.environ.get('AWS_DEFAULT_REGION') or 'us-east-1'
+        self.access_key = access_key or os.environ.get('AWS_ACCESS_KEY_ID', '')
+        self.secret_key = secret_key or os.environ.get('AWS_SECRET_ACCESS_KEY', '')
+        self.session_token = session_token or os.environ.get('AWS_SESSION_TOKEN')
+        self.throttle = throttle
+        self.history = history
+        self.max_connections = max_connections
+        self.part_size = max(part_size, MIN_PART_SIZE)
+
+        endpoint = urllib.parse.urlsplit(endpoint_url or f"https://s3.{self.region}.amazonaws.com")
+        self.host = endpoint.netloc
+        self.base_path = endpoint.path.rstrip('/')
+        self.pool = ConnectionPool(endpoint.scheme, endpoint.netloc, max_connections)
+
+        self._known_names: Dict[str, Set[str]] = {}
+        self._folder_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._part_executor = ThreadPoolExecutor(max_workers=max_connections)
+
+    # -- HTTP and signing -------------------------------------------------
+
+    def _sign(self, method: str, path: str, query: Dict[str, str], headers: Dict[str, str],
+              payload_hash: str) -> None:
+        """Add AWS Signature Version 4 headers for the request."""
+        now = datetime.datetime.now(datetime.timezone.utc)
+        amz_date = now.strftime('%Y%m%dT%H%M%SZ')
+        date_stamp = now.strftime('%Y%m%d')
+
+        headers['host'] = self.host
+        headers['x-amz-date'] = amz_date
+        headers['x-amz-content-sha256'] = payload_hash
+        if self.session_token:
+            headers['x-amz-security-token'] = self.session_token
+
+        signed = sorted(name for name in headers if name == 'host' or name.startswith('x-amz-'))
+        canonical_headers = ''.join(f"{name}:{headers[name].strip()}\n" for name in signed)
+        signed_headers = ';'.join(signed)
+        canonical_query = '&'.join(
+            f"{_uri_encode(key)}={_uri_encode(value)}" for key, value in sorted(query.items())
+        )
+        canonical_request = '\n'.join([
+            method, _uri_encode(path, safe='-_.~/'), canonical_query,
+            canonical_headers, signed_headers, payload_hash,
+        ])
+
+        scope = f"{date_stamp}/{self.region}/s3/aws4_request"
+        string_to_sign = '\n'.join([
+            'AWS4-HMAC-SHA256', amz_date, scope,
+            hashlib.sha256(canonical_request.encode('utf-8')).hexdigest(),
+        ])
+
+        key = ('AWS4' + self.secret_key).encode('utf-8')
+        for part in (date_stamp, self.region, 's3', 'aws4_request'):
+            key = hmac.new(key, part.encode('utf-8'), hashlib.sha256).digest()
+        signature = hmac.new(key, string_to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
+
+        headers['authorization'] = (
+            f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, "
+            f"SignedHeaders={signed_headers}, Signature={signature}"
+        )
+
+    def _request(self, method: str, key: str = '', query: Optional[Dict[str, str]] = None,
+                 headers: Optional[Dict[str, str]] = None, body: bytes = b'') -> Tuple[int, Dict[str, str], bytes]:
+        """Send a signed request over a pooled connection and return (status, headers, body)."""
+        path = f"{self.base_path}/{self.bucket}" + (f"/{key}" if key else '')
+        query = query or {}
+        url = _uri_encode(path, safe='-_.~/')
+        if query:
+            url += '?' + '&'.join(f"{_uri_encode(k)}={_uri_encode(v)}" for k, v in sorted(query.items()))
+
+        for attempt in range(2):
+            request_headers = dict(headers or {})
+            request_headers['content-length'] = str(len(body))
+            self._sign(method, path, query, request_headers,
+                       hashlib.sha256(body).hexdigest() if body else EMPTY_SHA256)
+
+            connection, reused = self.pool.acquire()
+            try:
+                connection.request(method, url, body=body, headers=request_headers)
+                response = connection.getresponse()
+            except (http.client.HTTPException, OSError) as e:
+                connection.close()
+                # The server may have closed an idle keep-alive connection, which shows up as
+                # the connection dropping before any response. Only then is it known to be safe
+                # to resend; a timeout or a fresh connection failing may mean the request landed.
+                if attempt == 0 and reused and isinstance(e, ConnectionError):
+                    continue
+                raise
+            try:
+                data = response.read()
+            except (http.client.HTTPException, OSError):
+                connection.close()
+                raise
+
+            if response.will_close:
+                connection.close()
+            else:
+                self.pool.release(connection)
+
+            response_headers = {name.lower(): value for name, value in response.getheaders()}
+            if response.status >= 300:
+                raise self._error(response.status, data)
+            return response.status, response_headers, data
+
+        raise AssertionError("unreachable")
+
+    @staticmethod
+    def _error(status: int, data: bytes) -> S3Error:
+        code, message = 'Error', data[:200].decode('utf-8', 'replace')
+        try:
+            root = ET.fromstring(data)
+            code = _xml_text(root, 'Code') or code
+            message = _xml_text(root, 'Message') or message
+        except ET.ParseError:
+            pass
+        return S3Error(status, code, message)
+
+    # -- Naming -----------------------------------------------------------
+
+    def _folder_key(self, folder_name: str) -> str:
+        return '/'.join(part for part in (self.prefix, folder_name) if part)
+
+    def _list_names(self, folder_name: str) -> Set[str]:
+        """List the object names directly inside folder_name."""
+        folder_prefix = self._folder_key(folder_name) + '/'
+        names = set()
+        query = {'list-type': '2', 'prefix': folder_prefix, 'delimiter': '/'}
+        while True:
+            _, _, data = self._request('GET', query=query)
+            root = ET.fromstring(data)
+            for key in _xml_find_all(root, 'Key'):
+                if key.text:
+                    names.add(key.text[len(folder_prefix):])
+            token = _xml_text(root, 'NextContinuationToken')
+            if _xml_text(root, 'IsTruncated') != 'true' or not token:
+                return names
+            query = dict(query, **{'continuation-token': token})
+
+    def _reserve_name(self, folder_name: str, filename: str) -> str:
+        """Pick a name not yet used in folder_name (stem_N on collision) and claim it."""
+        with self._lock:
+            folder_lock = self._folder_locks.setdefault(folder_name, threading.Lock())
+        with folder_lock:
+            names = self._known_names.get(folder_name)
+            if names is None:
+                # One listing per folder replaces a HEAD request per file
+                names = self._known_names[folder_name] = self._list_names(folder_name)
+
+            name_part, extension = Path(filename).stem, Path(filename).suffix
+            candidate, counter = filename, 0
+            while candidate in names:
+                counter += 1
+                candidate = f"{name_part}_{counter}{extension}"
+            names.add(candidate)
+            return candidate
+
+    # -- Uploads ----------------------------------------------------------
+
+    def _object_matches(self, key: str, size: int, etag: str) -> bool:
+        """Whether the object at key has the given size and ETag."""
+        try:
+            _, headers, _ = self._request('HEAD', key)
+        except S3Error:
+            return False
+        return headers.get('content-length') == str(size) and headers.get('etag') == etag
+
+    def _put_object(self, key: str, source_file: Path) -> None:
+        data = source_file.read_bytes()
+        if self.throttle is not None:
+            self.throttle.wait_bytes(len(data))
+        try:
+            # If-None-Match makes the write fail instead of replacing an existing object
+            self._request('PUT', key, headers={'if-none-match': '*'}, body=data)
+        except S3Error as e:
+            # If a resent PUT had landed the first time, the object there is already ours
+            if _is_name_collision(e) and self._object_matches(key, len(data), f'"{hashlib.md5(data).hexdigest()}"'):
+                return
+            raise
+
+    def _upload_part(self, key: str, upload_id: str, part_number: int, source_file: Path,
+                     offset: int, size: int) -> str:
+        with open(source_file, 'rb') as f:
+            f.seek(offset)
+            data = f.read(size)
+        if self.throttle is not None:
+            self.throttle.wait_bytes(len(data))
+        status, headers, _ = self._request('PUT', key, query={'partNumber': str(part_number), 'uploadId': upload_id},
+                                           body=data)
+        etag = headers.get('etag')
+        if not etag:
+            # Completing the upload needs every part's ETag
+            raise S3Error(status, 'MissingETag', f"no ETag returned for part {part_number} of {key}")
+        return etag
+
+    def _multipart_upload(self, key: str, source_file: Path, size: int) -> None:
+        status, _, data = self._request('POST', key, query={'uploads': ''})
+        upload_id = _xml_text(ET.fromstring(data), 'UploadId')
+        if not upload_id:
+            raise S3Error(status, 'MissingUploadId', f"no UploadId returned for {key}")
+        try:
+            futures = [
+                self._part_executor.submit(self._upload_part, key, upload_id, number, source_file,
+                                           offset, min(self.part_size, size - offset))
+                for number, offset in enumerate(range(0, size, self.part_size), start=1)
+            ]
+            etags = [future.result() for future in futures]
+
+            parts = ''.join(
+                f"<Part><PartNumber>{number}</PartNumber><ETag>{etag}</ETag></Part>"
+                for number, etag in enumerate(etags, start=1)
+            )
+            body = f"<CompleteMultipartUpload>{parts}</CompleteMultipartUpload>".encode('utf-8')
+            try:
+                _, _, data = self._request('POST', key, query={'uploadId': upload_id},
+                                           headers={'if-none-match': '*'}, body=body)
+                # CompleteMultipartUpload can fail with a 200 status and an error document
+                if b'<Error>' in data:
+                    raise self._error(200, data)
+            except S3Error as e:
+                # As for single PUTs, a resent request may find its own completed upload,
+                # reported as a collision or as the upload id no longer existing
+                if ((_is_name_collision(e) or e.code == 'NoSuchUpload')
+                        and self._object_matches(key, size, _multipart_etag(etags))):
+                    return
+                raise
+        except BaseException:
+            try:
+                self._request('DELETE', key, query={'uploadId': upload_id})
+            except OSError as e:
+                logging.error(f"Failed to abort multipart upload {upload_id} for {key}: {e}")
+            raise
+
+    def _upload(self, source_file: Path, folder_name: str) -> str:
+        """Upload source_file under a free name in folder_name, returning the name used."""
+        size = source_file.stat().st_size
+        while True:
+            name = self._reserve_name(folder_name, source_file.name)
+            key = f"{self._folder_key(folder_name)}/{name}"
+            try:
+                if size > self.part_size:
+                    self._multipart_upload(key, source_file, size)
+                else:
+                    self._put_object(key, source_file)
+                return name
+            except S3Error as e:
+                # Another writer created the object since we listed the folder
+                if not _is_name_collision(e):
+                    raise
+
+    def describe(self, folder_name: str) -> str:
+        return f"s3://{self.bucket}/{self._folder_key(folder_name)}"
+
+    def create_folder(self, folder_name: str) -> bool:
+        # Object stores have no folders to create
+        return True
+
+    def move_file(self, source_file: Path, folder_name: str) -> bool:
+        destination = self.describe(folder_name)
+        try:
+            if self.throttle is not None:
+                self.throttle.wait_op()
+            name = self._upload(source_file, folder_name)
+            source_file.unlink()
+            if self.history is not None:
+                self.history.record(source_file, f"{destination}/{name}")
+        except (OSError, ET.ParseError) as e:
+            print(f"Error moving file {source_file.name} to {destination}: {e}")
+            logging.error(f"Error moving file {source_file.name} to {destination}: {e}")
+            return False
+
+        if name != source_file.name:
+            print(f"Moved file: {source_file.name} to {destination} (renamed to {name})")
+            logging.info(f"Moved file: {source_file.name} to {destination}, renamed to {name}")
+        else:
+            print(f"Moved file: {source_file.name} to {destination}")
+            logging.info(f"Moved file: {source_file.name} to {destination}")
+        return True
+
+    def move_files(self, items: Iterable[Tuple[Path, str]]) -> int:
+        """Upload files concurrently, one pooled connection per worker."""
+        moved = 0
+        in_flight = []
+        with ThreadPoolExecutor(max_workers=self.max_connections) as executor:
+            for source_file, folder_name in items:
+                in_flight.append(executor.submit(self.move_file, source_file, folder_name))
+                # Keep the queue bounded so huge directories don't pile up futures
+                if len(in_flight) >= self.max_connections * 4:
+                    moved += sum(future.result() for future in in_flight)
+                    in_flight = []
+            moved += sum(future.result() for future in in_flight)
+        return moved
+
+    def close(self) -> None:
+        self._part_executor.shutdown()
+        self.pool.close()
+
+
+def open_backend(target: str, throttle=None, endpoint_url: Optional[str] = None,
+                 history=None) -> StorageBackend:
+    """Create a backend from a target such as '/mnt/archive' or 's3://bucket/prefix'."""
+    if target.startswith('s3://'):
+        parsed = urllib.parse.urlsplit(target)
+        if not parsed.netloc:
+            raise ValueError(f"No bucket in target {target}")
+        return S3StorageBackend(parsed.netloc, parsed.path, endpoint_url=endpoint_url, throttle=throttle,
+                                history=history)
+    return LocalStorageBackend(Path(target), throttle, history)
@@ -0,0 +1,136 @@
+"""
+I/O throttling for running the organizer on busy hosts.
+
+Provides token-bucket limits on bytes and file operations per second, an optional
+pause while the system load average is too high, and a helper to drop the calling
+thread into a lower I/O scheduling class with ioprio_set(2).
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Optional
+
+# ioprio_set(2) constants (see <linux/ioprio.h>)
+IOPRIO_WHO_PROCESS = 1
+IOPRIO_CLASS_RT = 1
+IOPRIO_CLASS_BE = 2
+IOPRIO_CLASS_IDLE = 3
+IOPRIO_CLASS_SHIFT = 13
+
+# The syscall has no glibc wrapper, so it is called by number
+_IOPRIO_SET_SYSCALLS = {
+    'x86_64': 251,
+    'i386': 289,
+    'i686': 289,
+    'aarch64': 30,
+    'armv7l': 314,
+    'ppc64le': 273,
+    's390x': 282,
+}
+
+LOAD_CHECK_INTERVAL = 5.0
+
+
+class TokenBucket:
+    """Thread-safe token bucket that blocks callers until enough tokens are available."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        # Allow roughly one second of burst by default
+        self.capacity = float(capacity) if capacity is not None else self.rate
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, amount: float = 1.0) -> None:
+        """Take amount tokens, sleeping as long as needed to stay under the rate.
+
+        Requests larger than the capacity are allowed and simply leave the bucket
+        in debt, so a single big file is paced rather than rejected.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= amount
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+
+
+class IOThrottle:
+    """Rate and load limits applied to the organizer's move and copy path."""
+
+    def __init__(self, bytes_per_sec: Optional[float] = None, ops_per_sec: Optional[float] = None,
+                 max_load: Optional[float] = None):
+        self.bytes_bucket = TokenBucket(bytes_per_sec) if bytes_per_sec else None
+        self.ops_bucket = TokenBucket(ops_per_sec) if ops_per_sec else None
+        self.max_load = max_load
+
+    @property
+    def limits_bytes(self) -> bool:
+        """Whether copies need to be chunked so their bytes can be paced."""
+        return self.bytes_bucket is not None
+
+    def wait_op(self) -> None:
+        """Block before a file operation until the ops limit and load threshold allow it."""
+        self.wait_for_load()
+        if self.ops_bucket is not None:
+            self.ops_bucket.consume(1)
+
+    def wait_bytes(self, count: int) -> None:
+        """Block until count bytes may be transferred."""
+        if self.bytes_bucket is not None and count > 0:
+            self.bytes_bucket.consume(count)
+
+    def wait_for_load(self) -> None:
+        """Pause while the 1-minute load average is above max_load."""
+        if self.max_load is None or not hasattr(os, 'getloadavg'):
+            return
+
+        paused = False
+        while os.getloadavg()[0] > self.max_load:
+            if not paused:
+                load = os.getloadavg()[0]
+                print(f"System load {load:.2f} is above {self.max_load}, pausing...")
+                logging.info(f"Pausing: system load {load:.2f} above threshold {self.max_load}")
+                paused = True
+            time.sleep(LOAD_CHECK_INTERVAL)
+
+        if paused:
+            logging.info("Resuming: system load back under threshold")
+
+
+def set_io_priority(io_class: int = IOPRIO_CLASS_IDLE, level: int = 0) -> bool:
+    """Set the I/O scheduling class of the calling thread, returning True on success.
+
+    Only supported on Linux; on other platforms (or unknown architectures) this is a no-op.
+    """
+    if not sys.platform.startswith('linux'):
+        return False
+
+    syscall_number = _IOPRIO_SET_SYSCALLS.get(os.uname().machine)
+    if syscall_number is None:
+        logging.warning(f"ioprio_set is not known for architecture {os.uname().machine}")
+        return False
+
+    try:
+        import ctypes
+        libc = ctypes.CDLL(None, use_errno=True)
+        ioprio = (io_class << IOPRIO_CLASS_SHIFT) | level
+        # who=0 means the calling thread
+        if libc.syscall(syscall_number, IOPRIO_WHO_PROCESS, 0, ioprio) != 0:
+            err = ctypes.get_errno()
+            logging.warning(f"ioprio_set failed: {os.strerror(err)}")
+            return False
+    except (OSError, AttributeError) as e:
+        logging.warning(f"ioprio_set unavailable: {e}")
+        return False
+
+    logging.info(f"Set I/O priority class {io_class}, level {level}")
+    return True
@@ -0,0 +1,164 @@
+"""
+Age/size-based tiering of organized files to a secondary (cold) volume.
+
+Organized files that are larger than a size threshold, or older than a number of
+days by mtime or atime, are moved into the same category layout under a cold
+root. The scan collects one record per file into columns, the policy is evaluated
+over whole columns at once, and the selected files are copied by a thread pool
+that allows only a bounded number of concurrent streams per device.
+Optionally a symlink stub is left at the original location.
+"""
+
+import logging
+import os
+import threading
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+
+from file_organizer import (
+    create_destination_directory,
+    get_destination_folder_name,
+    move_file_no_clobber,
+    should_skip_file
+)
+
+DEFAULT_STREAMS_PER_DEVICE = 2
+SECONDS_PER_DAY = 86400
+
+# Files are tiered from pool threads; one lock keeps their console lines whole
+_print_lock = threading.Lock()
+
+
+class TieringPolicy(NamedTuple):
+    """Which organized files move to the cold volume, and how."""
+    cold_root: Path
+    min_size: Optional[int] = None
+    older_than_days: Optional[float] = None
+    use_atime: bool = False
+    streams_per_device: int = DEFAULT_STREAMS_PER_DEVICE
+    leave_symlink: bool = False
+
+
+class FileRecords:
+    """Column-oriented scan results: one entry per organized file."""
+
+    def __init__(self):
+        self.paths: List[Path] = []
+        self.folders: List[str] = []
+        self.sizes = array('q')
+        self.mtimes = array('d')
+        self.atimes = array('d')
+        self.devices = array('Q')
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def append(self, path: Path, folder: str, stat: os.stat_result) -> None:
+        self.paths.append(path)
+        self.folders.append(folder)
+        self.sizes.append(stat.st_size)
+        self.mtimes.append(stat.st_mtime)
+        self.atimes.append(stat.st_atime)
+        self.devices.append(stat.st_dev)
+
+
+def scan_organized_files(organized_dir: Path) -> FileRecords:
+    """Collect records for files sitting in their category folder under organized_dir.
+
+    Symlinks (including stubs left by earlier tiering runs) are not included.
+    """
+    records = FileRecords()
+    for folder in sorted(organized_dir.iterdir()):
+        if not folder.is_dir() or should_skip_file(folder):
+            continue
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if (entry.is_file(follow_symlinks=False) and not should_skip_file(Path(entry.name))
+                        and get_destination_folder_name(os.path.splitext(entry.name)[1].lower()) == folder.name):
+                    records.append(Path(entry.path), folder.name, entry.stat(follow_symlinks=False))
+    return records
+
+
+def select_for_tiering(records: FileRecords, policy: TieringPolicy, now: Optional[float] = None) -> List[int]:
+    """Return the indices of records the policy moves to the cold volume.
+
+    The thresholds are applied column by column rather than per file object.
+    """
+    count = len(records)
+    selected = [False] * count
+    if policy.min_size is not None:
+        min_size = policy.min_size
+        selected = [size >= min_size for size in records.sizes]
+    if policy.older_than_days is not None:
+        cutoff = (time.time() if now is None else now) - policy.older_than_days * SECONDS_PER_DAY
+        times = records.atimes if policy.use_atime else records.mtimes
+        selected = [hit or t < cutoff for hit, t in zip(selected, times)]
+    return [i for i, hit in enumerate(selected) if hit]
+
+
+def _tier_one(source_file: Path, folder: str, policy: TieringPolicy, throttle=None, history=None) -> bool:
+    """Move one file to the cold volume, leaving a symlink stub if requested."""
+    with _print_lock:
+        destination_dir = create_destination_directory(policy.cold_root, folder)
+    if destination_dir is None:
+        return False
+
+    try:
+        if throttle is not None:
+            throttle.wait_op()
+        destination_path = move_file_no_clobber(source_file, destination_dir, throttle)
+    except OSError as e:
+        with _print_lock:
+            print(f"Error tiering file {source_file.name} to {destination_dir}: {e}")
+        logging.error(f"Error tiering file {source_file} to {destination_dir}: {e}")
+        return False
+
+    if history is not None:
+        history.record(source_file, str(destination_path))
+    with _print_lock:
+        print(f"Tiered file: {source_file.name} to {destination_path}")
+    logging.info(f"Tiered file: {source_file} to {destination_path}")
+
+    if policy.leave_symlink:
+        try:
+            # cold_root is absolute (see tier_files), so the stub resolves from any folder
+            os.symlink(str(destination_path), str(source_file))
+        except OSError as e:
+            logging.error(f"Could not leave symlink stub at {source_file}: {e}")
+    return True
+
+
+def tier_files(organized_dir: Path, policy: TieringPolicy, throttle=None, history=None) -> int:
+    """Move organized files matching policy to the cold volume, returning how many moved."""
+    # Symlink stubs and the history need paths that don't depend on the working directory
+    policy = policy._replace(cold_root=Path(os.path.abspath(policy.cold_root)))
+    records = scan_organized_files(organized_dir)
+    selected = select_for_tiering(records, policy)
+    if not selected:
+        return 0
+
+    policy.cold_root.mkdir(parents=True, exist_ok=True)
+    cold_device = policy.cold_root.stat().st_dev
+
+    # Bound concurrent streams on every device involved so no disk is thrashed
+    streams = max(1, policy.streams_per_device)
+    device_slots: Dict[int, threading.Semaphore] = {cold_device: threading.Semaphore(streams)}
+    for i in selected:
+        device_slots.setdefault(records.devices[i], threading.Semaphore(streams))
+
+    def run(i: int) -> bool:
+        # Always acquire in device order so two streams can't deadlock
+        devices = sorted({records.devices[i], cold_device})
+        for device in devices:
+            device_slots[device].acquire()
+        try:
+            return _tier_one(records.paths[i], records.folders[i], policy, throttle, history)
+        finally:
+            for device in reversed(devices):
+                device_slots[device].release()
+
+    with ThreadPoolExecutor(max_workers=streams * len(device_slots)) as executor:
+        return sum(executor.map(run, selected))
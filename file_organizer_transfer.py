@@ -0,0 +1,200 @@
+"""
+Chunked, resumable transfer for large files moved across devices.
+
+The destination is preallocated with posix_fallocate(), data is copied in large
+chunks with copy_file_range() (falling back to plain reads and writes), and a
+checkpoint next to the partial file records how far the copy got. Re-running an
+interrupted move picks up from the last checkpoint. Before the caller removes the
+source, the copy is verified with a streaming BLAKE2 hash of both files.
+"""
+
+import errno
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Callable, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+LARGE_FILE_THRESHOLD = 256 * 1024 * 1024
+TRANSFER_CHUNK_SIZE = 64 * 1024 * 1024
+HASH_CHUNK_SIZE = 4 * 1024 * 1024
+PARTIAL_SUFFIX = '.organizer-partial'
+CHECKPOINT_SUFFIX = '.organizer-checkpoint'
+
+ProgressCallback = Callable[[int, int], None]
+
+# errno values meaning copy_file_range can't be used for this pair of files
+_COPY_FILE_RANGE_UNSUPPORTED = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF}
+
+
+def partial_path_for(source_file: Path, destination_dir: Path) -> Path:
+    """Return the hidden, deterministic path a large transfer is written to.
+
+    The name carries a short hash of the source's path and inode, so two organizers
+    moving different files with the same name into one folder never share it.
+    """
+    stat = source_file.stat()
+    key = f"{source_file.resolve()}\0{stat.st_dev}\0{stat.st_ino}".encode('utf-8', 'surrogateescape')
+    digest = hashlib.blake2b(key, digest_size=6).hexdigest()
+    return destination_dir / f".{source_file.name}.{digest}{PARTIAL_SUFFIX}"
+
+
+def _checkpoint_path(partial_path: Path) -> Path:
+    return partial_path.with_name(partial_path.name + CHECKPOINT_SUFFIX)
+
+
+def _source_identity(source_file: Path, stat: os.stat_result) -> dict:
+    """Fields that must be unchanged for a checkpoint to be resumed."""
+    return {'source': str(source_file.resolve()), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _load_checkpoint(partial_path: Path, identity: dict) -> int:
+    """Return the offset to resume from, or 0 if there is no usable checkpoint."""
+    try:
+        with open(_checkpoint_path(partial_path), encoding='utf-8') as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return 0
+    if any(checkpoint.get(key) != value for key, value in identity.items()):
+        return 0
+    if not partial_path.exists():
+        return 0
+    return int(checkpoint.get('offset', 0))
+
+
+def _save_checkpoint(partial_path: Path, identity: dict, offset: int) -> None:
+    """Atomically record that the first offset bytes of the partial file are durable."""
+    checkpoint_path = _checkpoint_path(partial_path)
+    temp_path = checkpoint_path.with_name(checkpoint_path.name + '.tmp')
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(dict(identity, offset=offset), f)
+    os.replace(str(temp_path), str(checkpoint_path))
+
+
+def discard_partial(partial_path: Path) -> None:
+    """Remove a partial file and its checkpoint."""
+    for path in (partial_path, _checkpoint_path(partial_path)):
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _preallocate(fd: int, size: int) -> None:
+    """Reserve space for the whole file up front, where the filesystem supports it."""
+    if not hasattr(os, 'posix_fallocate') or size == 0:
+        return
+    try:
+        os.posix_fallocate(fd, 0, size)
+    except OSError as e:
+        if e.errno not in (errno.EOPNOTSUPP, errno.EINVAL, errno.ENOSYS):
+            raise
+
+
+def _copy_chunk(src_fd: int, dst_fd: int, offset: int, count: int, use_copy_file_range: bool) -> int:
+    """Copy up to count bytes at offset, returning how many were copied."""
+    if use_copy_file_range:
+        return os.copy_file_range(src_fd, dst_fd, count, offset, offset)
+
+    copied = 0
+    while copied < count:
+        data = os.pread(src_fd, min(HASH_CHUNK_SIZE, count - copied), offset + copied)
+        if not data:
+            break
+        os.pwrite(dst_fd, data, offset + copied)
+        copied += len(data)
+    return copied
+
+
+def _files_match(source_file: Path, partial_path: Path) -> bool:
+    """Compare two files with streaming BLAKE2 hashes."""
+    source_hash = hashlib.blake2b()
+    partial_hash = hashlib.blake2b()
+    with open(source_file, 'rb') as src, open(partial_path, 'rb') as dst:
+        while True:
+            src_chunk = src.read(HASH_CHUNK_SIZE)
+            dst_chunk = dst.read(HASH_CHUNK_SIZE)
+            source_hash.update(src_chunk)
+            partial_hash.update(dst_chunk)
+            if not src_chunk and not dst_chunk:
+                break
+    return source_hash.digest() == partial_hash.digest()
+
+
+def transfer_large_file(source_file: Path, partial_path: Path, throttle=None,
+                        progress: Optional[ProgressCallback] = None) -> None:
+    """Copy source_file to partial_path, resuming from a checkpoint if one matches.
+
+    On return the partial file is a verified copy of the source with its metadata;
+    the caller renames it into place and removes the source. A failed verification
+    discards the partial copy and raises OSError.
+    """
+    stat = source_file.stat()
+    total = stat.st_size
+    identity = _source_identity(source_file, stat)
+
+    src_fd = os.open(str(source_file), os.O_RDONLY)
+    try:
+        # No O_TRUNC: the partial file may belong to a transfer still in progress
+        dst_fd = os.open(str(partial_path), os.O_WRONLY | os.O_CREAT, 0o600)
+        try:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(dst_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    raise OSError(errno.EBUSY, f"{source_file.name} is already being transferred by another organizer")
+            offset = _load_checkpoint(partial_path, identity)
+            if offset:
+                print(f"Resuming {source_file.name} at {offset} of {total} bytes")
+                logging.info(f"Resuming transfer of {source_file} at byte {offset} of {total}")
+            else:
+                os.ftruncate(dst_fd, 0)
+                _preallocate(dst_fd, total)
+                _save_checkpoint(partial_path, identity, 0)
+
+            use_copy_file_range = hasattr(os, 'copy_file_range')
+            while offset < total:
+                count = min(TRANSFER_CHUNK_SIZE, total - offset)
+                if throttle is not None:
+                    throttle.wait_bytes(count)
+                try:
+                    copied = _copy_chunk(src_fd, dst_fd, offset, count, use_copy_file_range)
+                except OSError as e:
+                    if not use_copy_file_range or e.errno not in _COPY_FILE_RANGE_UNSUPPORTED:
+                        raise
+                    use_copy_file_range = False
+                    continue
+                if copied == 0:
+                    if use_copy_file_range:
+                        # Some filesystems report 0 instead of an error
+                        use_copy_file_range = False
+                        continue
+                    raise OSError(errno.EIO, f"{source_file} shrank during transfer")
+
+                offset += copied
+                # Only checkpoint bytes that are on disk
+                if hasattr(os, 'fdatasync'):
+                    os.fdatasync(dst_fd)
+                else:
+                    os.fsync(dst_fd)
+                _save_checkpoint(partial_path, identity, offset)
+                if progress is not None:
+                    progress(offset, total)
+            os.ftruncate(dst_fd, total)
+        finally:
+            os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+
+    if not _files_match(source_file, partial_path):
+        discard_partial(partial_path)
+        raise OSError(errno.EIO, f"Verification of {source_file.name} failed, copy discarded")
+
+    os.utime(str(partial_path), ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    os.chmod(str(partial_path), stat.st_mode & 0o7777)
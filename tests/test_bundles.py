@@ -0,0 +1,128 @@
+"""
+Tests for small-file consolidation into tar bundles.
+
+Every test checks the bundles the way a restore would see them: each indexed
+member is extracted and compared byte for byte with the original data, and the
+bundle must still be a valid tar archive listing the same members.
+"""
+
+import os
+import sys
+import tarfile
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import file_organizer_bundles as bundles  # noqa: E402
+
+
+class ConsolidateSmallFilesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.category_dir = Path(self.temp_dir.name) / 'Documents'
+        self.category_dir.mkdir()
+        self.originals = {}
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def make_files(self, count, size):
+        for number in range(count):
+            name = f"f{number}.txt"
+            data = bytes([number % 256]) * size + name.encode()
+            (self.category_dir / name).write_bytes(data)
+            self.originals[name] = data
+
+    def bundle_paths(self):
+        return bundles._list_bundles(self.category_dir / bundles.BUNDLE_DIR_NAME)
+
+    def assert_bundles_intact(self):
+        """Extract every indexed member and compare it with its original data."""
+        indexed = []
+        restore_dir = Path(self.temp_dir.name) / 'restore'
+        restore_dir.mkdir(exist_ok=True)
+        for bundle_path in self.bundle_paths():
+            entries = bundles.read_index(bundle_path)
+            with tarfile.open(bundle_path) as tar:
+                self.assertEqual(tar.getnames(), [entry['name'] for entry in entries])
+            for entry in entries:
+                restored = bundles.extract_bundled_file(bundle_path, entry, restore_dir)
+                self.assertEqual(restored.read_bytes(), self.originals[entry['name']], entry['name'])
+                restored.unlink()
+                indexed.append(entry['name'])
+        return indexed
+
+    def test_short_read_does_not_corrupt_bundle_or_delete_original(self):
+        self.make_files(4, 300 * 1024)
+        real_copyfileobj = tarfile.copyfileobj
+        calls = []
+
+        def shrink_second_file(src, dst, length=None, *args, **kwargs):
+            calls.append(src.name)
+            if len(calls) == 2:
+                # The file shrinks after gettarinfo() recorded its size
+                os.truncate(src.name, 1000)
+            return real_copyfileobj(src, dst, length, *args, **kwargs)
+
+        with mock.patch.object(tarfile, 'copyfileobj', shrink_second_file):
+            consolidated = bundles.consolidate_small_files(self.category_dir, 1024 * 1024)
+
+        shrunk = Path(calls[1])
+        self.assertEqual(consolidated, 3)
+        self.assertTrue(shrunk.exists())
+        self.assertEqual(sorted(p.name for p in self.category_dir.glob('*.txt')), [shrunk.name])
+        self.assertEqual(sorted(self.assert_bundles_intact()),
+                         sorted(name for name in self.originals if name != shrunk.name))
+
+    def test_file_that_grows_is_not_bundled(self):
+        self.make_files(3, 1000)
+        real_copyfileobj = tarfile.copyfileobj
+        calls = []
+
+        def grow_first_file(src, dst, length=None, *args, **kwargs):
+            calls.append(src.name)
+            if len(calls) == 1:
+                with open(src.name, 'ab') as f:
+                    f.write(b'appended')
+            return real_copyfileobj(src, dst, length, *args, **kwargs)
+
+        with mock.patch.object(tarfile, 'copyfileobj', grow_first_file):
+            consolidated = bundles.consolidate_small_files(self.category_dir, 1024 * 1024)
+
+        self.assertEqual(consolidated, 2)
+        self.assertTrue(Path(calls[0]).exists())
+        self.assertEqual(len(self.assert_bundles_intact()), 2)
+
+    def test_bundle_size_is_an_upper_bound(self):
+        self.make_files(40, 1500)
+        max_size = 20 * 1024
+
+        consolidated = bundles.consolidate_small_files(self.category_dir, 4096, bundle_max_size=max_size)
+
+        self.assertEqual(consolidated, 40)
+        self.assertGreater(len(self.bundle_paths()), 1)
+        for bundle_path in self.bundle_paths():
+            self.assertLessEqual(bundle_path.stat().st_size, max_size)
+        self.assertEqual(len(self.assert_bundles_intact()), 40)
+
+    def test_appending_to_existing_bundle_and_latest_lookup(self):
+        self.make_files(3, 100)
+        bundles.consolidate_small_files(self.category_dir, 4096)
+        # A second run bundles a newer copy of f1.txt into the same bundle
+        newer = b'newer copy'
+        (self.category_dir / 'f1.txt').write_bytes(newer)
+        bundles.consolidate_small_files(self.category_dir, 4096)
+
+        matches = bundles.find_bundled_file(self.category_dir, 'f1.txt')
+        self.assertEqual(len(matches), 2)
+        restored = bundles.extract_from_organized_folders(self.category_dir.parent, 'f1.txt')
+        self.assertEqual(restored.read_bytes(), newer)
+        self.assertIsNone(bundles.find_latest_bundled_file(self.category_dir, 'missing.txt'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,327 @@
+"""
+Tests for the S3-compatible storage backend against a local stand-in server.
+
+The stand-in keeps objects in memory and implements just enough of the S3 API
+for the backend: ListObjectsV2 with pagination, conditional PUT (If-None-Match),
+HEAD, and multipart uploads. It can also drop a connection after handling a
+request, to check that the backend only resends requests when that is safe.
+"""
+
+import hashlib
+import sys
+import tempfile
+import threading
+import unittest
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from file_organizer_storage import MIN_PART_SIZE, S3StorageBackend  # noqa: E402
+
+BUCKET = 'bucket'
+
+
+class FakeS3:
+    """In-memory bucket state shared by the request handler threads."""
+
+    def __init__(self, page_size=2):
+        self.objects = {}  # key -> (data, etag)
+        self.uploads = {}  # upload id -> {part number: data}
+        self.page_size = page_size
+        self.requests = []  # (method, key, query)
+        # Callables run before a request is handled; return 'drop' to close the
+        # connection without a response, 'drop-after' to do so after handling it,
+        # or 'malformed' to answer without the ETag header and UploadId element
+        self.hooks = []
+        self.lock = threading.Lock()
+        self.next_upload = 0
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    @property
+    def s3(self) -> FakeS3:
+        return self.server.s3
+
+    def _parse(self):
+        url = urllib.parse.urlsplit(self.path)
+        path = urllib.parse.unquote(url.path).lstrip('/')
+        bucket, _, key = path.partition('/')
+        query = dict(urllib.parse.parse_qsl(url.query, keep_blank_values=True))
+        length = int(self.headers.get('content-length') or 0)
+        body = self.rfile.read(length) if length else b''
+        return bucket, key, query, body
+
+    def _reply(self, status, body=b'', headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if self.command != 'HEAD':
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _handle(self):
+        bucket, key, query, body = self._parse()
+        assert bucket == BUCKET
+        assert self.headers['authorization'].startswith('AWS4-HMAC-SHA256 Credential=test/')
+        with self.s3.lock:
+            self.s3.requests.append((self.command, key, query))
+            actions = [hook(self.command, key, query) for hook in self.s3.hooks]
+        if 'drop' in actions:
+            self.close_connection = True
+            return
+
+        handler = getattr(self, f"do_{self.command}_s3")
+        with self.s3.lock:
+            status, data, headers = handler(key, query, body)
+        if 'drop-after' in actions:
+            # The request took effect but the response is lost
+            self.close_connection = True
+            return
+        if 'malformed' in actions:
+            headers = {name: value for name, value in (headers or {}).items() if name != 'ETag'}
+            data = data.replace(b'<UploadId>', b'<Other>').replace(b'</UploadId>', b'</Other>')
+        self._reply(status, data, headers)
+
+    def do_GET(self):
+        self._handle()
+
+    def do_PUT(self):
+        self._handle()
+
+    def do_POST(self):
+        self._handle()
+
+    def do_HEAD(self):
+        self._handle()
+
+    def do_DELETE(self):
+        self._handle()
+
+    # The do_*_s3 methods run under the state lock and return (status, body, headers)
+
+    def do_GET_s3(self, key, query, body):
+        prefix = query.get('prefix', '')
+        keys = sorted(k for k in self.s3.objects if k.startswith(prefix))
+        start = int(query.get('continuation-token', '0'))
+        page = keys[start:start + self.s3.page_size]
+        truncated = start + self.s3.page_size < len(keys)
+        contents = ''.join(f"<Contents><Key>{escape(k)}</Key></Contents>" for k in page)
+        token = f"<NextContinuationToken>{start + self.s3.page_size}</NextContinuationToken>" if truncated else ''
+        xml = (f'<ListBucketResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">{contents}'
+               f"<IsTruncated>{'true' if truncated else 'false'}</IsTruncated>{token}</ListBucketResult>")
+        return _ok(xml.encode())
+
+    def do_HEAD_s3(self, key, query, body):
+        if key not in self.s3.objects:
+            return 404, b'', None
+        data, etag = self.s3.objects[key]
+        return _ok(headers={'ETag': etag, 'Content-Length': str(len(data))})
+
+    def do_PUT_s3(self, key, query, body):
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        if 'uploadId' in query:
+            self.s3.uploads[query['uploadId']][int(query['partNumber'])] = body
+            return _ok(headers={'ETag': etag})
+        if self.headers.get('if-none-match') == '*' and key in self.s3.objects:
+            return _s3_error(412, 'PreconditionFailed')
+        self.s3.objects[key] = (body, etag)
+        return _ok(headers={'ETag': etag})
+
+    def do_POST_s3(self, key, query, body):
+        if 'uploads' in query:
+            self.s3.next_upload += 1
+            upload_id = f"upload-{self.s3.next_upload}"
+            self.s3.uploads[upload_id] = {}
+            return _ok(f"<InitiateMultipartUploadResult><UploadId>{upload_id}</UploadId>"
+                       f"</InitiateMultipartUploadResult>".encode())
+        upload_id = query['uploadId']
+        if upload_id not in self.s3.uploads:
+            return _s3_error(404, 'NoSuchUpload')
+        if self.headers.get('if-none-match') == '*' and key in self.s3.objects:
+            return _s3_error(412, 'PreconditionFailed')
+        parts = self.s3.uploads.pop(upload_id)
+        data = b''.join(parts[number] for number in sorted(parts))
+        digests = b''.join(hashlib.md5(parts[number]).digest() for number in sorted(parts))
+        etag = f'"{hashlib.md5(digests).hexdigest()}-{len(parts)}"'
+        self.s3.objects[key] = (data, etag)
+        return _ok(f"<CompleteMultipartUploadResult><ETag>{etag}</ETag>"
+                   f"</CompleteMultipartUploadResult>".encode())
+
+    def do_DELETE_s3(self, key, query, body):
+        if self.s3.uploads.pop(query.get('uploadId'), None) is None:
+            return _s3_error(404, 'NoSuchUpload')
+        return 204, b'', None
+
+
+def _ok(body=b'', headers=None):
+    return 200, body, headers
+
+
+def _s3_error(status, code):
+    return status, f"<Error><Code>{code}</Code><Message>{code}</Message></Error>".encode(), None
+
+
+class S3StorageBackendTest(unittest.TestCase):
+
+    def setUp(self):
+        self.s3 = FakeS3()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.server.s3 = self.s3
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.source_dir = Path(self.temp_dir.name)
+        self.backend = self.make_backend()
+
+    def tearDown(self):
+        self.backend.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.temp_dir.cleanup()
+
+    def make_backend(self, **kwargs):
+        return S3StorageBackend(BUCKET, 'archive', endpoint_url=f"http://127.0.0.1:{self.server.server_port}",
+                                region='us-east-1', access_key='test', secret_key='test', **kwargs)
+
+    def make_file(self, name, data):
+        path = self.source_dir / name
+        path.write_bytes(data)
+        return path
+
+    def put_existing(self, key, data=b'existing'):
+        self.s3.objects[key] = (data, f'"{hashlib.md5(data).hexdigest()}"')
+
+    def count(self, method, query_key=None):
+        return sum(1 for m, _, query in self.s3.requests if m == method and (query_key is None or query_key in query))
+
+    def test_lists_folder_once_and_renames_around_existing_objects(self):
+        for name in ('a.txt', 'a_1.txt', 'x.txt', 'y.txt', 'z.txt'):
+            self.put_existing(f"archive/Documents/{name}")
+        files = [self.make_file(name, name.encode()) for name in ('a.txt', 'b.txt', 'c.txt')]
+
+        moved = self.backend.move_files((path, 'Documents') for path in files)
+
+        self.assertEqual(moved, 3)
+        self.assertEqual(self.s3.objects['archive/Documents/a_2.txt'][0], b'a.txt')
+        self.assertEqual(self.s3.objects['archive/Documents/b.txt'][0], b'b.txt')
+        self.assertEqual(self.s3.objects['archive/Documents/c.txt'][0], b'c.txt')
+        self.assertEqual(self.s3.objects['archive/Documents/a.txt'][0], b'existing')
+        self.assertFalse(any(path.exists() for path in files))
+        # Five existing keys at two per page: one listing of three pages, no HEAD per file
+        self.assertEqual(self.count('GET'), 3)
+        self.assertEqual(self.count('HEAD'), 0)
+
+    def test_object_created_after_listing_is_not_overwritten(self):
+        source = self.make_file('report.pdf', b'mine')
+
+        def create_first(method, key, query):
+            if method == 'PUT' and key == 'archive/Documents/report.pdf':
+                self.put_existing(key, b'someone else')
+        self.s3.hooks.append(create_first)
+
+        self.assertTrue(self.backend.move_file(source, 'Documents'))
+        self.assertEqual(self.s3.objects['archive/Documents/report.pdf'][0], b'someone else')
+        self.assertEqual(self.s3.objects['archive/Documents/report_1.pdf'][0], b'mine')
+
+    def test_multipart_upload(self):
+        data = bytes(range(256)) * (MIN_PART_SIZE * 2 // 256 + 100)
+        source = self.make_file('video.mp4', data)
+        backend = self.make_backend(part_size=MIN_PART_SIZE)
+        try:
+            self.assertTrue(backend.move_file(source, 'Videos'))
+        finally:
+            backend.close()
+
+        self.assertEqual(self.s3.objects['archive/Videos/video.mp4'][0], data)
+        self.assertTrue(self.s3.objects['archive/Videos/video.mp4'][1].endswith('-3"'))
+        self.assertEqual(self.count('PUT', 'partNumber'), 3)
+        self.assertEqual(self.s3.uploads, {})
+
+    def test_resent_put_that_landed_is_not_duplicated(self):
+        source = self.make_file('notes.txt', b'notes')
+        dropped = []
+
+        def lose_first_put_response(method, key, query):
+            if method == 'PUT' and not dropped:
+                dropped.append(key)
+                return 'drop-after'
+        self.s3.hooks.append(lose_first_put_response)
+
+        # The listing leaves a keep-alive connection in the pool for the PUT to reuse
+        self.assertTrue(self.backend.move_file(source, 'Documents'))
+        self.assertEqual(dropped, ['archive/Documents/notes.txt'])
+        self.assertEqual(sorted(self.s3.objects), ['archive/Documents/notes.txt'])
+        self.assertEqual(self.count('PUT'), 2)
+
+    def test_resent_multipart_completion_that_landed_is_not_duplicated(self):
+        data = b'x' * (MIN_PART_SIZE + 10)
+        source = self.make_file('disk.img', data)
+        backend = self.make_backend(part_size=MIN_PART_SIZE, max_connections=1)
+        dropped = []
+
+        def lose_completion_response(method, key, query):
+            if method == 'POST' and 'uploadId' in query and not dropped:
+                dropped.append(key)
+                return 'drop-after'
+        self.s3.hooks.append(lose_completion_response)
+
+        try:
+            self.assertTrue(backend.move_file(source, 'MISC'))
+        finally:
+            backend.close()
+        self.assertEqual(sorted(self.s3.objects), ['archive/MISC/disk.img'])
+        self.assertEqual(self.s3.objects['archive/MISC/disk.img'][0], data)
+        self.assertEqual(self.count('DELETE'), 0)
+
+    def test_part_without_etag_fails_only_that_file(self):
+        data = b'x' * (MIN_PART_SIZE + 10)
+        big = self.make_file('disk.img', data)
+        small = self.make_file('notes.txt', b'notes')
+        backend = self.make_backend(part_size=MIN_PART_SIZE)
+        self.s3.hooks.append(lambda method, key, query: 'malformed' if 'partNumber' in query else None)
+
+        try:
+            moved = backend.move_files([(big, 'MISC'), (small, 'Documents')])
+        finally:
+            backend.close()
+        self.assertEqual(moved, 1)
+        self.assertTrue(big.exists())
+        self.assertFalse(small.exists())
+        self.assertEqual(sorted(self.s3.objects), ['archive/Documents/notes.txt'])
+        # The incomplete upload was aborted
+        self.assertEqual(self.s3.uploads, {})
+
+    def test_initiate_without_upload_id_fails_the_file(self):
+        source = self.make_file('disk.img', b'x' * (MIN_PART_SIZE + 10))
+        backend = self.make_backend(part_size=MIN_PART_SIZE)
+        self.s3.hooks.append(lambda method, key, query: 'malformed' if 'uploads' in query else None)
+
+        try:
+            self.assertFalse(backend.move_file(source, 'MISC'))
+        finally:
+            backend.close()
+        self.assertTrue(source.exists())
+        self.assertEqual(self.count('PUT'), 0)
+
+    def test_failure_on_fresh_connection_is_not_resent(self):
+        source = self.make_file('a.txt', b'a')
+        self.s3.hooks.append(lambda method, key, query: 'drop')
+
+        self.assertFalse(self.backend.move_file(source, 'Documents'))
+        self.assertTrue(source.exists())
+        self.assertEqual(len(self.s3.requests), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()